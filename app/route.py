@@ -1,26 +1,35 @@
 import json
-import os
-from typing import Optional
+from typing import List, Optional
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Depends
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 
-from database import CallDetails
-from models import CallDetailsModel, UserLogin, UserRegister
+from database import Job
+from models import CallDetailsModel, CallQuestionModel, NoteTypesRequestModel, UserLogin, UserRegister, TokenRefresh
 
-from services.auth_service import AuthService
+from services.ask_service import AskService
+from services.auth_service import AuthService, current_user_id
+from services.batch_service import BatchService
+from services.call_service import CallService
+from services.job_service import JobService
 from services.transcription_service import TranscriptionService
+from services.upload_service import UploadService
+from settings import Config
 
 
-UPLOAD_DIR = "./temp_chunks"  # Directory to store chunks
-sessions = {}  # Dictionary to keep track of sessions and associated data
-
 #
 class NoteBotRoute:
     def __init__(self, connection_manager, server_memory):
         self.router = APIRouter(tags=["NoteBot"])
         self.manager = connection_manager
         self.memory = server_memory
+        self.call_service = CallService()
         self.transcription_service = TranscriptionService()
+        self.ask_service = AskService(self.call_service, self.transcription_service)
+        self.job_service = JobService(self.transcription_service, self.manager)
+        self.batch_service = BatchService(self.job_service)
+        self.upload_service = UploadService()
         self.define_routes()
 
     def define_routes(self):
@@ -41,20 +50,88 @@ class NoteBotRoute:
             # Delegate the login process to AuthService
             return await AuthService.login_user(user)
 
+        @self.router.post("/refresh")
+        async def refresh_tokens(request: TokenRefresh):
+            # Exchange a refresh token for a new access/refresh pair
+            return await AuthService.refresh_tokens(request)
+
         @self.router.get("/calls")
-        async def get_all_call_details():
+        async def get_all_call_details(
+                cursor: Optional[str] = None,  # next_cursor from the previous page
+                limit: int = Config.CALLS_PAGE_SIZE,
+                start_date: Optional[float] = None,  # Unix timestamps, start inclusive and end exclusive
+                end_date: Optional[float] = None,
+                call_type: Optional[str] = None,
+                note_type: Optional[str] = None,
+                user_id: str = Depends(current_user_id)
+        ):
             try:
-                # Query all CallDetails documents from MongoDB
-                call_details_list = CallDetails.objects.all()
-
-                # Convert each CallDetails document to a dictionary using to_dict()
-                call_details_dicts = [call_detail.to_dict() for call_detail in call_details_list]
-
-                # Return the list of call details as JSON
-                return {"call_details": call_details_dicts}
-
+                # One page of calls, newest first, without transcriptions or note responses
+                return await self.call_service.list_calls(user_id, cursor, limit, start_date, end_date, call_type, note_type)
+            except HTTPException:
+                raise
             except Exception as e:
                 print(f"Error retrieving call details: {str(e)}")
+                raise HTTPException(status_code=500, detail="Error retrieving call details")
+
+        @self.router.get("/calls/search")
+        async def search_calls(
+                q: str,
+                mode: str = "text",  # "text" (keywords) or "semantic" (meaning; needs embeddings enabled)
+                limit: int = Config.SEARCH_RESULT_LIMIT,
+                user_id: str = Depends(current_user_id)
+        ):
+            # Ranked matches in titles, notes and transcripts; transcript hits include start/end in ms
+            return await self.call_service.search_service.search(user_id, q, mode, limit)
+
+        @self.router.get("/calls/{call_id}")
+        async def get_call_details(call_id: str, user_id: str = Depends(current_user_id)):
+            # Full call, including the transcription and note type responses
+            return await self.call_service.get_call(user_id, call_id)
+
+        @self.router.post("/calls/{call_id}/ask")
+        async def ask_about_call(call_id: str, request: CallQuestionModel, user_id: str = Depends(current_user_id)):
+            # Answer from the transcript windows most relevant to the question, with their time ranges
+            return await self.ask_service.ask(user_id, call_id, request)
+
+        @self.router.post("/calls/{call_id}/notes")
+        async def add_call_notes(call_id: str, request: NoteTypesRequestModel, user_id: str = Depends(current_user_id)):
+            # Generate extra (or, with regenerate, replacement) note types from the stored transcript
+            return await self.transcription_service.add_note_types(user_id, call_id, request.note_types,
+                                                                   request.regenerate)
+
+        @self.router.post("/calls/import")
+        async def import_call_details(calls: List[CallDetailsModel], user_id: str = Depends(current_user_id)):
+            # Bulk import of already transcribed calls, stored for the authenticated user
+            return await self.call_service.import_calls(user_id, calls)
+
+        @self.router.get("/jobs/{job_id}")
+        async def get_job(job_id: str, wait: float = 0, user_id: str = Depends(current_user_id)):
+            # With ?wait=<seconds> the request is held open until the job finishes (long-poll)
+            if wait > 0:
+                job = await self.job_service.wait_for_job(job_id, wait, user_id)
+            else:
+                job = await self.job_service.get_job(job_id, user_id)
+            return job.to_dict()
+
+        @self.router.get("/jobs/{job_id}/events")
+        async def stream_job_events(job_id: str, user_id: str = Depends(current_user_id)):
+            # Server-sent events: stage changes, segment progress for long recordings, then the result
+            events = await self.job_service.stream_events(job_id, user_id)
+            return StreamingResponse(events, media_type="text/event-stream",
+                                     headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+        @self.router.get("/upload_status/{session_id}")
+        async def get_upload_status(session_id: str, user_id: str = Depends(current_user_id)):
+            # Lets clients resume an interrupted upload by re-sending only the missing chunks
+            status = await self.upload_service.get_status(session_id, user_id)
+            if status:
+                return status
+
+            job = await self.job_service.find_session_job(session_id)
+            if job and job.owner == user_id:
+                return {"session_id": session_id, "complete": True, "missing_chunks": [], "job_id": str(job.id)}
+            raise HTTPException(status_code=404, detail="Upload session not found")
 
         @self.router.post("/upload_call_details")
         async def upload_call_details(
@@ -62,68 +139,71 @@ class NoteBotRoute:
                 chunk_index: int = Form(...),  # Chunk index for ordering
                 total_chunks: int = Form(...),  # Total number of chunks expected
                 call_details: Optional[str] = Form(None),  # Call details JSON, sent with the first chunk
-                file: UploadFile = File(...)
+                checksum: Optional[str] = Form(None),  # Optional SHA-256 hex digest of this chunk
+                priority: Optional[str] = Form(None),  # "deferred" generates notes through the batch API, at a discount
+                file: UploadFile = File(...),
+                user_id: str = Depends(current_user_id)
         ):
             try:
-                # Ensure the upload directory exists
-                os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-                # Create a directory for the session if it does not exist
-                session_path = os.path.join(UPLOAD_DIR, session_id)
-                os.makedirs(session_path, exist_ok=True)
-
-                # If call details are provided, store them for this session
-                if call_details and session_id not in sessions:
-                    call_details_dict = json.loads(call_details)
-                    sessions[session_id] = {
-                        "call_details": call_details_dict,
-                        "received_chunks": 0
-                    }
-                    print(f"Received call details for session {session_id}")
-
-                # Save the current chunk
-                chunk_path = os.path.join(session_path, f"chunk_{chunk_index}")
-                with open(chunk_path, "wb") as chunk_file:
-                    chunk_file.write(await file.read())
-
-                # Update the session's received chunk count
-                sessions[session_id]["received_chunks"] += 1
-                print(f"Received chunk {chunk_index + 1}/{total_chunks} for session {session_id}")
-
-                # Check if all chunks are received
-                if sessions[session_id]["received_chunks"] == total_chunks:
-                    # Assemble chunks into one file
-                    final_path = os.path.join(UPLOAD_DIR, f"{session_id}.m4a")
-                    with open(final_path, "wb") as final_file:
-                        for i in range(total_chunks):
-                            chunk_file_path = os.path.join(session_path, f"chunk_{i}")
-                            with open(chunk_file_path, "rb") as chunk:
-                                final_file.write(chunk.read())
-
-                    print(f"All chunks received for session {session_id}. File assembled at {final_path}")
-
-                    # Retrieve and process the call details
-                    call_details_dict = sessions[session_id]["call_details"]
-                    print('call details dict')
-                    call_details_model = CallDetailsModel(**call_details_dict)
-                    print(call_details_model.date)
-                    print('call details model')
-
-                    # Proceed with the transcription process
-                    result = await self.transcription_service.transcribe_audio(call_details_model, final_path)
-                    print('got result')
+                # A retried chunk for an upload that was already queued just gets the job id back
+                existing_job = await self.job_service.find_session_job(session_id)
+                if existing_job:
+                    if existing_job.owner != user_id:
+                        raise HTTPException(status_code=404, detail="Upload session not found")
+                    return {"message": "File already assembled and queued for processing",
+                            "job_id": str(existing_job.id)}
+
+                # Call details are sent with the first chunk; the session store keeps the first copy
+                if priority is not None and priority not in Job.PRIORITIES:
+                    raise HTTPException(status_code=400, detail=f"priority must be one of {', '.join(Job.PRIORITIES)}")
+
+                call_details_dict = json.loads(call_details) if call_details else None
+                if call_details_dict is not None:
+                    # The call belongs to whoever uploads it, whatever the payload claims
+                    call_details_dict["owner"] = user_id
+                    # Reject bad call details with the chunk that carries them, not after the whole upload
+                    try:
+                        CallDetailsModel(**call_details_dict)
+                    except ValidationError as e:
+                        raise HTTPException(status_code=400, detail=f"Invalid call details: {str(e)}")
+                    # Kept with the call details, which the session stores from the first chunk
+                    call_details_dict["priority"] = priority or Job.IMMEDIATE
+
+                # Stream the current chunk to disk and record it on the shared session
+                session, duplicate, ready = await self.upload_service.receive_chunk(
+                    session_id, chunk_index, total_chunks, file, call_details_dict, checksum, user_id
+                )
+
+                # Exactly one request assembles the file once every chunk has arrived
+                if ready:
+                    try:
+                        final_path = await self.upload_service.assemble(session_id, session["total_chunks"])
+                        print(f"All chunks received for session {session_id}. File assembled at {final_path}")
+
+                        # Hand the assembled file to the job queue instead of transcribing inside this request
+                        call_details_dict = dict(session["call_details"])
+                        job_priority = call_details_dict.pop("priority", Job.IMMEDIATE)
+                        CallDetailsModel(**call_details_dict)  # Validate now so bad payloads fail in this request
+                        job = await self.job_service.enqueue(session_id, call_details_dict, final_path,
+                                                             job_priority, user_id)
+                    except Exception:
+                        # Give up the claim so re-sending the last chunk can assemble the session again
+                        await self.upload_service.release(session_id)
+                        raise
+
                     # Clean up chunks and session data
-                    for i in range(total_chunks):
-                        os.remove(os.path.join(session_path, f"chunk_{i}"))
-                    os.rmdir(session_path)
-                    del sessions[session_id]
+                    await self.upload_service.finish(session_id)
 
-                    return {"message": "File assembled and processed successfully", "data": result}
+                    return {"message": "File assembled and queued for processing", "job_id": str(job.id)}
 
+                if duplicate:
+                    return {"message": f"Chunk {chunk_index + 1} was already received"}
                 return {"message": f"Chunk {chunk_index + 1} received successfully"}
             except json.JSONDecodeError as e:
                 print(f"Failed to parse call details JSON: {str(e)}")
                 raise HTTPException(status_code=400, detail=f"Failed to parse call details JSON: {str(e)}")
+            except HTTPException:
+                raise
             except Exception as e:
                 print(f"Error during chunk upload: {str(e)}")
                 raise HTTPException(status_code=400, detail="Failed to upload chunk")
@@ -0,0 +1,132 @@
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+
+from bson import ObjectId
+
+from database import Database, AsyncDatabase, CallDetails, TokenUsage
+from services.call_service import CallService
+from settings import Config
+
+
+def seed_calls(owner: str, count: int, legacy: bool):
+    """
+    Insert count calls for owner. Legacy calls reference a TokenUsage document each, as calls saved
+    before cost was embedded do; the others embed their cost. Returns the TokenUsage ids inserted.
+    """
+    now = datetime.now(timezone.utc)
+    cost = {"transcription_cost": 0.01, "input_cost": 0.002, "output_cost": 0.004, "total_cost": 0.016}
+    token_usage_ids = [ObjectId() for _ in range(count)] if legacy else []
+    if legacy:
+        TokenUsage._get_collection().insert_many([dict(cost, _id=token_usage_id) for token_usage_id in token_usage_ids])
+
+    calls = []
+    for index in range(count):
+        call = {
+            "owner": owner,
+            "date": now - timedelta(minutes=index),
+            "callType": "Benchmark",
+            "notes": "",
+            "participants": [{"id": str(uuid.uuid4()), "name": "Speaker", "role": "Participant", "isHost": True}],
+            "notetype": ["Summary", "Action Items"],
+            "minutes_elapsed": 30.0,
+            "title": f"Benchmark call {index}",
+            "note_type_responses": {"Summary": "Summary " * 200, "Action Items": "Item " * 100},
+        }
+        if legacy:
+            call["token_usage"] = token_usage_ids[index]
+        else:
+            call["cost"] = dict(cost, model=Config.NOTE_MODEL)
+        calls.append(call)
+    for start in range(0, count, 1000):
+        CallDetails._get_collection().insert_many(calls[start:start + 1000])
+    return token_usage_ids
+
+
+def remove_calls(owners: list, token_usage_ids: list):
+    CallDetails._get_collection().delete_many({"owner": {"$in": owners}})
+    if token_usage_ids:
+        TokenUsage._get_collection().delete_many({"_id": {"$in": token_usage_ids}})
+
+
+def serialise_per_call(owner: str):
+    # The old list path: one TokenUsage round-trip per call while serialising
+    calls = CallDetails.objects(owner=owner).exclude(*CallService.LIST_EXCLUDED_FIELDS).order_by('-date', '-id')
+    return [call.to_dict() for call in calls]
+
+
+async def serialise_pages(call_service: CallService, owner: str):
+    # Every page of list_calls, as the call history screen loads them
+    calls = []
+    cursor = None
+    while True:
+        page = await call_service.list_calls(owner, cursor, Config.CALLS_MAX_PAGE_SIZE)
+        calls.extend(page["call_details"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            return calls
+
+
+async def timed(function, repeat: int):
+    # Median wall time in milliseconds; function may be a coroutine function
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        if asyncio.iscoroutine(result):
+            result = await result
+        durations.append((time.perf_counter() - started) * 1000)
+    return statistics.median(durations), len(result)
+
+
+async def benchmark(sizes: list, repeat: int):
+    call_service = CallService()
+    rows = []
+    for size in sizes:
+        legacy_owner, embedded_owner = f"benchmark-{uuid.uuid4().hex}", f"benchmark-{uuid.uuid4().hex}"
+        token_usage_ids = []
+        try:
+            token_usage_ids = seed_calls(legacy_owner, size, legacy=True)
+            seed_calls(embedded_owner, size, legacy=False)
+
+            for name, function in (
+                ("per-call dereference (legacy)", lambda: serialise_per_call(legacy_owner)),
+                ("list_calls pages (legacy)", lambda: serialise_pages(call_service, legacy_owner)),
+                ("list_calls pages (embedded)", lambda: serialise_pages(call_service, embedded_owner)),
+            ):
+                milliseconds, count = await timed(function, repeat)
+                assert count == size, f"{name} returned {count} of {size} calls"
+                rows.append((size, name, milliseconds))
+                print(f"{size:>6} calls  {name:<32} {milliseconds:>10.1f} ms  {milliseconds * 1000 / size:>8.1f} us/call")
+        finally:
+            remove_calls([legacy_owner, embedded_owner], token_usage_ids)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare call history serialisation: per-call TokenUsage lookups against list_calls, "
+                    "which loads each page's token usage in one query or reads the embedded cost."
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000], help="Calls per run")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement; the median is reported")
+    args = parser.parse_args()
+
+    Database()
+
+    async def run():
+        try:
+            return await benchmark(args.sizes, args.repeat)
+        finally:
+            await AsyncDatabase.close()
+
+    asyncio.run(run())
+
+
+# Run from the repository root against a development database (calls are inserted and removed again):
+# python -m benchmarks.list_calls_serialisation --sizes 10 1000 10000
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+
+
+async def sample_ping(client: httpx.AsyncClient, prefix: str, interval: float, stop: asyncio.Event):
+    # /ping latencies in milliseconds, sampled every interval seconds until stop is set
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get(f"{prefix}/ping")
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - started) * 1000)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+    return latencies
+
+
+async def upload(client: httpx.AsyncClient, prefix: str, headers: dict, audio: bytes, minutes: float):
+    # One single-chunk upload; returns the id of the job it queued
+    call_details = {
+        "date": datetime.now(timezone.utc).isoformat(),
+        "callType": "Load test",
+        "notes": "",
+        "participants": [{"name": "Speaker", "role": "Participant", "isHost": True}],
+        "notetype": ["Summary"],
+        "minutes_elapsed": minutes,
+    }
+    response = await client.post(
+        f"{prefix}/upload_call_details",
+        headers=headers,
+        data={"session_id": uuid.uuid4().hex, "chunk_index": 0, "total_chunks": 1,
+              "call_details": json.dumps(call_details)},
+        files={"file": ("audio.m4a", audio, "audio/mp4")},
+    )
+    response.raise_for_status()
+    return response.json()["job_id"]
+
+
+async def wait_for_jobs(client: httpx.AsyncClient, prefix: str, headers: dict, job_ids: list, timeout: float):
+    # Long-poll every job until it finishes; returns {job id: final stage}
+    deadline = time.monotonic() + timeout
+    stages = {}
+    for job_id in job_ids:
+        stage = None
+        while stage not in ("completed", "failed") and time.monotonic() < deadline:
+            response = await client.get(f"{prefix}/jobs/{job_id}", headers=headers, params={"wait": 30},
+                                        timeout=60)
+            response.raise_for_status()
+            stage = response.json()["stage"]
+        stages[job_id] = stage
+    return stages
+
+
+def summarize(latencies: list):
+    if not latencies:
+        return "no samples"
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return (f"{len(ordered)} samples, p50 {statistics.median(ordered):.1f} ms, p95 {p95:.1f} ms, "
+            f"max {ordered[-1]:.1f} ms")
+
+
+async def run(args):
+    prefix = f"{args.base_url.rstrip('/')}/api/notebot"
+    with open(args.audio, "rb") as audio_file:
+        audio = audio_file.read()
+
+    async with httpx.AsyncClient(timeout=args.request_timeout) as client:
+        response = await client.post(f"{prefix}/login", json={"email": args.email, "password": args.password})
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        # Idle baseline
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_ping(client, prefix, args.ping_interval, stop))
+        await asyncio.sleep(args.baseline_seconds)
+        stop.set()
+        baseline = await sampler
+
+        # The same latency while the transcriptions are uploaded, transcribed and summarised
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_ping(client, prefix, args.ping_interval, stop))
+        started = time.monotonic()
+        job_ids = await asyncio.gather(*[upload(client, prefix, headers, audio, args.minutes)
+                                         for _ in range(args.transcriptions)])
+        stages = await wait_for_jobs(client, prefix, headers, job_ids, args.timeout)
+        stop.set()
+        loaded = await sampler
+
+    print(f"Idle:   {summarize(baseline)}")
+    print(f"Loaded: {summarize(loaded)}")
+    finished = sum(stage == "completed" for stage in stages.values())
+    print(f"{finished}/{len(job_ids)} transcriptions completed in {time.monotonic() - started:.0f} s "
+          f"({', '.join(f'{stage}: {list(stages.values()).count(stage)}' for stage in set(stages.values()))})")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure /ping latency of a running API while N transcriptions are in flight. "
+                    "Uses real AssemblyAI and OpenAI requests, which are billed."
+    )
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--email", required=True, help="Existing user to upload the recordings as")
+    parser.add_argument("--password", default=os.getenv("LOAD_TEST_PASSWORD"),
+                        help="Password of that user (default: LOAD_TEST_PASSWORD)")
+    parser.add_argument("--audio", required=True, help="Recording uploaded once per transcription")
+    parser.add_argument("--minutes", type=float, default=1.0, help="Length of the recording, in minutes")
+    parser.add_argument("--transcriptions", type=int, default=10, help="Transcriptions in flight at once")
+    parser.add_argument("--baseline-seconds", type=float, default=10.0)
+    parser.add_argument("--ping-interval", type=float, default=0.2, help="Seconds between /ping requests")
+    parser.add_argument("--timeout", type=float, default=1800.0, help="Seconds to wait for the transcriptions")
+    parser.add_argument("--request-timeout", type=float, default=120.0)
+    args = parser.parse_args()
+    if not args.password:
+        parser.error("--password or LOAD_TEST_PASSWORD is required")
+
+    asyncio.run(run(args))
+
+
+# Run from the repository root against a running API:
+# python -m benchmarks.ping_under_load --email you@example.com --audio sample.m4a --transcriptions 20
+if __name__ == "__main__":
+    main()
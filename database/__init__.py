@@ -0,0 +1,12 @@
+from database.database import Database
+from database.call_details import CallDetails, Participant
+from database.transcript import Transcript
+from database.search_entry import SearchEntry
+from database.transcription import TokenUsage, CallCost
+from database.user import User
+from database.job import Job
+from database.upload_session import UploadSession
+from database.result_cache import ResultCache, ResultCacheUsage
+from database.async_database import AsyncDatabase
+from database.repositories import UserRepository, TokenUsageRepository, CallDetailsRepository, \
+    TranscriptRepository, SearchEntryRepository
@@ -0,0 +1,39 @@
+from pymongo import AsyncMongoClient
+
+from settings import Config
+
+
+class AsyncDatabase:
+    """
+    Shared PyMongo AsyncMongoClient for request handlers, so database round-trips are awaited
+    instead of blocking the event loop. It reaches the same database as the MongoEngine
+    'notebot' connection. The client is created on first use, inside the running event loop.
+    """
+
+    _client = None
+
+    @classmethod
+    def client(cls):
+        if cls._client is None:
+            cls._client = AsyncMongoClient(
+                host=Config.MONGO_HOST,
+                username=Config.MONGO_USER,
+                password=Config.MONGO_PASS,
+                authSource='admin',
+                maxPoolSize=Config.MONGO_MAX_POOL_SIZE,
+                minPoolSize=Config.MONGO_MIN_POOL_SIZE,
+                maxIdleTimeMS=Config.MONGO_MAX_IDLE_TIME_MS,
+                waitQueueTimeoutMS=Config.MONGO_WAIT_QUEUE_TIMEOUT_MS
+            )
+        return cls._client
+
+    @classmethod
+    def collection(cls, document):
+        # The collection backing a MongoEngine document class
+        return cls.client()[Config.MONGO_DB][document._get_collection_name()]
+
+    @classmethod
+    async def close(cls):
+        if cls._client is not None:
+            await cls._client.close()
+            cls._client = None
@@ -0,0 +1,93 @@
+import uuid
+from datetime import datetime
+
+from bson import ObjectId
+from mongoengine import Document, EmbeddedDocument, DateTimeField, StringField, ListField, ReferenceField, \
+    DictField, FloatField, BooleanField, EmbeddedDocumentField
+
+from database.transcription import CallCost
+
+
+class Participant(EmbeddedDocument):
+    id = StringField(default=lambda: str(uuid.uuid4()))  # Generates UUID-compatible string if not provided
+    name = StringField(required=True)
+    role = StringField()
+    isHost = BooleanField(required=True)
+    additionalNotes = StringField()
+
+    def to_dict(self):
+        """
+        Convert the Participant document to a dictionary for API response.
+        """
+        data = self.to_mongo().to_dict()
+
+        # Convert id to a UUID-compatible string if it's an ObjectId
+        if not data.get("id"):
+            data["id"] = str(uuid.uuid4())
+        elif ObjectId.is_valid(data["id"]):
+            # Convert ObjectId to UUID-like format
+            data["id"] = str(uuid.UUID(bytes=data["id"].binary[:16]))
+
+        return data
+
+
+class CallDetails(Document):
+    owner = StringField()  # Id of the User the call belongs to
+    date = DateTimeField(required=True)
+    callType = StringField()
+    notes = StringField()
+    participants = ListField(EmbeddedDocumentField('Participant'))  # Store participants directly within CallDetails
+    notetype = ListField(StringField())  # Field to store note types
+    minutes_elapsed = FloatField()  # Matches `minutesElapsed` in the Swift struct
+    title = StringField()  # Optional field
+    transcription = DictField()  # Inline transcription of older calls; newer ones are stored as a Transcript
+    note_type_responses = DictField()  # Field to store responses for note types
+    failed_note_types = ListField(StringField())  # Requested note types that could not be generated
+    cost = EmbeddedDocumentField(CallCost)  # Token usage and cost, stored with the call
+    token_usage = ReferenceField('TokenUsage')  # Token usage of calls saved before cost was embedded
+
+    meta = {
+        'db_alias': 'notebot',
+        # Back each user's paged call history and its filters, all ordered newest first
+        'indexes': [
+            ('owner', '-date', '-id'),
+            ('owner', 'callType', '-date', '-id'),
+            ('owner', 'notetype', '-date', '-id'),
+        ]
+    }
+
+    def to_dict(self, token_usages: dict = None, transcript=None):
+        """
+        Convert the MongoEngine document to a dictionary suitable for JSON serialization.
+        Handles nested documents and cleans up MongoDB-specific fields like ObjectId.
+        token_usages, from TokenUsageRepository.find_by_ids, avoids a lookup per document when serializing a list.
+        The transcription is only included when its Transcript is passed in, so it is loaded only when needed.
+        """
+        data = self.to_mongo().to_dict()
+
+        if transcript is not None:
+            data["transcription"] = transcript.to_dict()
+
+        # Convert ObjectId to string
+        if "_id" in data:
+            data["id"] = str(data.pop("_id"))
+
+        # Convert date to Unix timestamp (float)
+        if "date" in data and isinstance(data["date"], datetime):
+            data["date"] = data["date"].timestamp()
+
+        # Token usage is embedded in newer calls and referenced by older ones; either way the
+        # API returns it as token_usage
+        if self.cost:
+            data["token_usage"] = self.cost.to_dict()
+            data.pop("cost", None)
+        elif token_usages is not None:
+            if data.get("token_usage") in token_usages:
+                data["token_usage"] = token_usages[data["token_usage"]].to_dict()
+        elif self.token_usage:
+            data["token_usage"] = self.token_usage.to_dict()
+
+        # Convert participants references
+        data["participants"] = [participant.to_dict() for participant in self.participants]
+
+        return data
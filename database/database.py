@@ -0,0 +1,27 @@
+from mongoengine import connect
+
+from database.call_details import CallDetails
+from database.search_entry import SearchEntry
+from database.transcript import Transcript
+from database.transcription import TokenUsage
+from database.user import User
+from settings import Config
+
+
+class Database:
+    def __init__(self):
+        # Register the 'notebot' alias used by every document in this package
+        connect(
+            db=Config.MONGO_DB,
+            alias='notebot',
+            host=Config.MONGO_HOST,
+            username=Config.MONGO_USER,
+            password=Config.MONGO_PASS,
+            authentication_source='admin'
+        )
+
+    @staticmethod
+    def ensure_indexes():
+        # Writes through the async repositories bypass MongoEngine's automatic index creation
+        for document in (CallDetails, Transcript, SearchEntry, TokenUsage, User):
+            document.ensure_indexes()
@@ -0,0 +1,65 @@
+from datetime import datetime, timezone
+
+from mongoengine import Document, StringField, DictField, DateTimeField, IntField
+
+
+class Job(Document):
+    # Stages a job moves through, in order; 'completed' and 'failed' are terminal
+    QUEUED = "queued"
+    UPLOADING = "uploading"
+    TRANSCRIBING = "transcribing"
+    SUMMARIZING = "summarizing"
+    BATCHED = "batched"  # Deferred jobs waiting for their notes from the batch API
+    SAVING = "saving"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    TERMINAL_STAGES = (COMPLETED, FAILED)
+
+    # Immediate jobs generate notes as soon as they are transcribed; deferred ones go through the batch API
+    IMMEDIATE = "immediate"
+    DEFERRED = "deferred"
+    PRIORITIES = (IMMEDIATE, DEFERRED)
+
+    session_id = StringField(required=True)  # Upload session that produced the audio file
+    owner = StringField()  # User who uploaded the audio; only they can read the job
+    file_path = StringField(required=True)  # Assembled audio file waiting to be transcribed
+    call_details = DictField(required=True)  # Raw call details sent with the first chunk
+    stage = StringField(required=True, default=QUEUED)
+    priority = StringField(default=IMMEDIATE, choices=PRIORITIES)
+    attempts = IntField(default=0)  # Number of times a worker has claimed this job
+    worker_id = StringField()  # Worker currently (or last) processing the job
+    progress = DictField()  # Latest segment progress of a long recording: phase, done, total
+    notes = DictField()  # Title and note type responses generated so far, while the job runs
+    result = DictField()  # Saved call details once the job completes
+    error = StringField()  # Failure reason if the job failed
+    batch_request = DictField()  # Pending note generation request of a batched job
+    batch_id = StringField()  # Batch the request was submitted in, once submitted
+    created_at = DateTimeField(default=lambda: datetime.now(timezone.utc))
+    updated_at = DateTimeField(default=lambda: datetime.now(timezone.utc))
+
+    meta = {
+        'db_alias': 'notebot',
+        'indexes': [('stage', 'created_at'), 'session_id', ('stage', 'batch_id')]
+    }
+
+    def to_dict(self):
+        """
+        Convert the Job document to a dictionary for API response.
+        """
+        data = {
+            "id": str(self.id),
+            "session_id": self.session_id,
+            "stage": self.stage,
+            "priority": self.priority,
+            "attempts": self.attempts,
+            "progress": self.progress or None,
+            "created_at": self.created_at.timestamp() if self.created_at else None,
+            "updated_at": self.updated_at.timestamp() if self.updated_at else None,
+        }
+        if self.stage not in Job.TERMINAL_STAGES and self.notes:
+            data["notes"] = self.notes
+        if self.stage == Job.COMPLETED:
+            data["result"] = self.result
+        if self.stage == Job.FAILED:
+            data["error"] = self.error
+        return data
@@ -0,0 +1,120 @@
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from database.async_database import AsyncDatabase
+from database.call_details import CallDetails
+from database.search_entry import SearchEntry
+from database.transcript import Transcript
+from database.transcription import TokenUsage
+from database.user import User
+
+
+class Repository:
+    """
+    Async reads and writes for one MongoEngine document class. Documents are validated and
+    serialized with MongoEngine, but every round-trip goes through AsyncDatabase, and results
+    come back as documents so their to_dict methods keep working.
+    """
+
+    document = None
+
+    @property
+    def collection(self):
+        return AsyncDatabase.collection(self.document)
+
+    async def insert(self, document):
+        document.validate()
+        result = await self.collection.insert_one(document.to_mongo())
+        document.id = result.inserted_id
+        return document
+
+    async def insert_many(self, documents: list):
+        # Bulk writes: one round-trip per batch instead of one per document
+        for document in documents:
+            document.validate()
+        result = await self.collection.insert_many([document.to_mongo() for document in documents], ordered=False)
+        for document, inserted_id in zip(documents, result.inserted_ids):
+            document.id = inserted_id
+        return documents
+
+    async def find_one(self, query: dict, projection: dict = None):
+        son = await self.collection.find_one(query, projection)
+        return self.document._from_son(son) if son else None
+
+    async def find(self, query: dict, projection: dict = None, sort: list = None, limit: int = 0):
+        cursor = self.collection.find(query, projection, sort=sort, limit=limit)
+        return [self.document._from_son(son) async for son in cursor]
+
+    async def update_one(self, query: dict, update: dict):
+        result = await self.collection.update_one(query, update)
+        return result.matched_count
+
+    async def delete_many(self, query: dict):
+        result = await self.collection.delete_many(query)
+        return result.deleted_count
+
+
+class UserRepository(Repository):
+    document = User
+
+    async def find_by_email(self, email: str):
+        return await self.find_one({"email": email})
+
+    async def insert(self, document):
+        # Duplicate emails are caught by the unique index, which also closes the register race
+        try:
+            return await super().insert(document)
+        except DuplicateKeyError:
+            raise ValueError("Email already registered")
+
+
+class TokenUsageRepository(Repository):
+    document = TokenUsage
+
+    async def find_by_ids(self, ids):
+        # One $in query for a whole page of calls, keyed by id for CallDetails.to_dict
+        ids = list(set(ids) - {None})
+        if not ids:
+            return {}
+        return {token_usage.id: token_usage for token_usage in await self.find({"_id": {"$in": ids}})}
+
+
+class CallDetailsRepository(Repository):
+    document = CallDetails
+
+
+class TranscriptRepository(Repository):
+    document = Transcript
+
+    async def find_by_call_id(self, call_id):
+        return await self.find_one({"call_id": call_id})
+
+
+class SearchEntryRepository(Repository):
+    document = SearchEntry
+
+    async def search_text(self, owner: str, query: str, kinds, limit: int):
+        # (entry, relevance) pairs for text index matches within owner, best first
+        cursor = self.collection.find(
+            {"owner": owner, "kind": {"$in": list(kinds)}, "$text": {"$search": query}},
+            {"score": {"$meta": "textScore"}, "embedding": 0},
+            sort=[("score", {"$meta": "textScore"})],
+            limit=limit
+        )
+        matches = []
+        async for son in cursor:
+            score = son.pop("score")
+            matches.append((self.document._from_son(son), score))
+        return matches
+
+    async def set_embeddings(self, embeddings: dict):
+        # {entry id: embedding bytes}, written in one bulk request
+        if embeddings:
+            embedded_at = datetime.now(timezone.utc)
+            await self.collection.bulk_write(
+                [UpdateOne({"_id": entry_id}, {"$set": {"embedding": embedding, "embedded_at": embedded_at}})
+                 for entry_id, embedding in embeddings.items()],
+                ordered=False
+            )
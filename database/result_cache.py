@@ -0,0 +1,26 @@
+from datetime import datetime, timezone
+
+from mongoengine import Document, StringField, DictField, IntField, DateTimeField
+
+
+class ResultCache(Document):
+    key = StringField(required=True, unique=True)  # Content hash of the inputs, prefixed with the kind
+    kind = StringField(required=True)  # "transcription" or "meeting_minutes"
+    payload = DictField(required=True)
+    size_bytes = IntField(required=True)  # Serialized payload size, used for size-bounded eviction
+    hits = IntField(default=0)
+    created_at = DateTimeField(default=lambda: datetime.now(timezone.utc))
+    last_used_at = DateTimeField(default=lambda: datetime.now(timezone.utc))
+
+    meta = {
+        'db_alias': 'notebot',
+        'indexes': ['last_used_at']
+    }
+
+
+class ResultCacheUsage(Document):
+    # Running total of size_bytes over all ResultCache entries, so writes need not sum the collection
+    id = StringField(primary_key=True)
+    size_bytes = IntField(default=0)
+
+    meta = {'db_alias': 'notebot'}
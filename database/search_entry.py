@@ -0,0 +1,36 @@
+from mongoengine import Document, StringField, ObjectIdField, IntField, BinaryField, DateTimeField
+
+
+class SearchEntry(Document):
+    """
+    One searchable piece of a call: its title, a note type response, a single utterance (for
+    full-text search with timestamps) or a window of consecutive utterances (for semantic
+    search and questions about the call). Rebuilt whenever the call is indexed.
+    """
+
+    TITLE = "title"
+    NOTE = "note"
+    UTTERANCE = "utterance"
+    WINDOW = "window"
+    TEXT_KINDS = (TITLE, NOTE, UTTERANCE)  # Windows repeat utterance text, so they are left out of text search
+
+    owner = StringField()
+    call_id = ObjectIdField(required=True)
+    kind = StringField(required=True)
+    note_type = StringField()  # For note entries
+    text = StringField(required=True)
+    speaker = StringField()  # For utterance entries
+    start = IntField()  # Milliseconds, for utterance and window entries
+    end = IntField()
+    embedding = BinaryField()  # float32 vector, for window, title and note entries once embedded
+    embedded_at = DateTimeField()  # When the embedding was written, so loaded vector indexes can pick it up
+
+    meta = {
+        'db_alias': 'notebot',
+        'indexes': [
+            ('owner', '$text'),  # Text index with an equality prefix, so searches stay within one owner
+            ('owner', 'kind'),
+            ('call_id', 'kind'),
+            ('owner', 'embedded_at'),
+        ]
+    }
@@ -0,0 +1,76 @@
+import sys
+import zlib
+from array import array
+
+from mongoengine import Document, ObjectIdField, ListField, StringField, BinaryField
+
+
+def _pack(typecode: str, values):
+    packed = array(typecode, values)
+    if sys.byteorder == "big":  # Stored little-endian whatever the host
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack(typecode: str, data: bytes):
+    unpacked = array(typecode)
+    unpacked.frombytes(data or b"")
+    if sys.byteorder == "big":
+        unpacked.byteswap()
+    return unpacked
+
+
+class Transcript(Document):
+    """
+    A call's utterances, stored apart from CallDetails in columnar form: one packed binary
+    array per utterance field plus a single compressed text blob. This avoids repeating the
+    speaker/start/end/text/confidence keys on every utterance and keeps call documents small.
+    """
+
+    call_id = ObjectIdField(required=True, unique=True)
+    speaker_labels = ListField(StringField())  # Distinct speaker labels, in order of appearance
+    speakers = BinaryField()  # uint16 index into speaker_labels, per utterance
+    starts = BinaryField()  # uint32 milliseconds
+    ends = BinaryField()  # uint32 milliseconds
+    confidences = BinaryField()  # float32
+    text_lengths = BinaryField()  # uint32 characters of each utterance within text
+    text = BinaryField()  # zlib-compressed UTF-8 of all utterance texts, concatenated
+
+    meta = {'db_alias': 'notebot'}
+
+    @classmethod
+    def from_utterances(cls, call_id, utterances: list):
+        labels = list(dict.fromkeys(utterance["speaker"] for utterance in utterances))
+        label_index = {label: index for index, label in enumerate(labels)}
+        return cls(
+            call_id=call_id,
+            speaker_labels=labels,
+            speakers=_pack("H", [label_index[utterance["speaker"]] for utterance in utterances]),
+            starts=_pack("I", [utterance["start"] for utterance in utterances]),
+            ends=_pack("I", [utterance["end"] for utterance in utterances]),
+            confidences=_pack("f", [utterance["confidence"] for utterance in utterances]),
+            text_lengths=_pack("I", [len(utterance["text"]) for utterance in utterances]),
+            text=zlib.compress("".join(utterance["text"] for utterance in utterances).encode())
+        )
+
+    def to_utterances(self):
+        text = zlib.decompress(self.text).decode() if self.text else ""
+        utterances = []
+        offset = 0
+        columns = zip(_unpack("H", self.speakers), _unpack("I", self.starts), _unpack("I", self.ends),
+                      _unpack("f", self.confidences), _unpack("I", self.text_lengths))
+        for speaker, start, end, confidence, length in columns:
+            utterances.append({
+                "speaker": self.speaker_labels[speaker],
+                "start": start,
+                "end": end,
+                "text": text[offset:offset + length],
+                # float32 storage; rounding drops the noise that precision loss adds
+                "confidence": round(confidence, 4),
+            })
+            offset += length
+        return utterances
+
+    def to_dict(self):
+        # Same shape as the transcription stored inline on older calls
+        return {"utterances": self.to_utterances()}
@@ -0,0 +1,36 @@
+from mongoengine import Document, EmbeddedDocument, FloatField, DictField, StringField
+
+
+class CallCost(EmbeddedDocument):
+    # Token usage and cost embedded in CallDetails, so a call is stored in a single write
+    model = StringField()  # Model the notes were generated with
+    transcription_cost = FloatField(required=True)
+    input_cost = FloatField(required=True)
+    output_cost = FloatField(required=True)
+    total_cost = FloatField(required=True)
+    note_types = DictField()  # Tokens and cost per note type, when each was generated in its own request
+
+    def to_dict(self):
+        return self.to_mongo().to_dict()
+
+
+class TokenUsage(Document):
+    # Separate token usage documents referenced by calls saved before CallCost was embedded
+    transcription_cost = FloatField(required=True)  # Cost of transcription (AssemblyAI)
+    input_cost = FloatField(required=True)  # Cost of input (prompt) tokens
+    output_cost = FloatField(required=True)  # Cost of output (completion) tokens
+    total_cost = FloatField(required=True)  # Total cost (transcription + tokens)
+
+    meta = {'db_alias': 'notebot'}
+
+    def to_dict(self):
+        """
+        Convert the TokenUsage document to a dictionary for API response.
+        """
+        data = self.to_mongo().to_dict()
+
+        # Convert ObjectId to string
+        if "_id" in data:
+            data["id"] = str(data.pop("_id"))
+
+        return data
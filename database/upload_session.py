@@ -0,0 +1,35 @@
+from datetime import datetime, timezone
+
+from mongoengine import Document, StringField, DictField, IntField, ListField, BooleanField, DateTimeField
+
+from utils import ChunkBitmap
+
+
+class UploadSession(Document):
+    session_id = StringField(required=True, unique=True)
+    owner = StringField()  # User who created the session; other users never see it
+    call_details = DictField()  # Raw call details sent with the first chunk
+    total_chunks = IntField(required=True)
+    chunk_words = ListField(IntField())  # ChunkBitmap words; bits are set atomically with $bit
+    assembling = BooleanField(default=False)  # Set by the one request that assembles the file
+    created_at = DateTimeField(default=lambda: datetime.now(timezone.utc))
+    updated_at = DateTimeField(default=lambda: datetime.now(timezone.utc))
+
+    meta = {
+        'db_alias': 'notebot',
+        'indexes': ['updated_at']
+    }
+
+    def to_session(self):
+        """
+        Convert the UploadSession document to the dictionary shape used by the session stores.
+        """
+        return {
+            "session_id": self.session_id,
+            "owner": self.owner,
+            "call_details": self.call_details or None,
+            "total_chunks": self.total_chunks,
+            "received_chunks": ChunkBitmap(self.total_chunks, self.chunk_words),
+            "assembling": self.assembling,
+            "updated_at": self.updated_at,
+        }
@@ -0,0 +1,13 @@
+from mongoengine import Document, EmailField, StringField
+
+
+class User(Document):
+    email = EmailField(required=True, unique=True)
+    hashed_password = StringField(required=True)
+    full_name = StringField(required=True)
+    phone_number = StringField(required=True, min_length=10, max_length=15)
+
+    meta = {
+        'collection': 'notebotuser',  # Same collection name but separate database
+        'db_alias': 'notebot'  # Specifies the NoteBot database
+    }
@@ -1,12 +1,17 @@
 import os
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
 
-from database import Database
+from database import Database, AsyncDatabase
 from app.route import NoteBotRoute
+from services.batch_service import require_single_process_backend
+from services.connection_manager import ConnectionManager
+from settings import Config
 
 
 class MaxSizeLimitMiddleware(BaseHTTPMiddleware):
@@ -21,11 +26,29 @@ class MaxSizeLimitMiddleware(BaseHTTPMiddleware):
         return await call_next(request)
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    Database.ensure_indexes()
+    # Run transcription job workers alongside the API; set JOB_WORKERS=0 to run them only via worker.py
+    if not Config.JOB_WORKERS:
+        require_single_process_backend()
+    notebot_router.job_service.start(Config.JOB_WORKERS)
+    if Config.JOB_WORKERS:
+        notebot_router.batch_service.start()
+    notebot_router.upload_service.start_sweeper()
+    yield
+    await notebot_router.upload_service.stop_sweeper()
+    await notebot_router.batch_service.stop()
+    await notebot_router.job_service.stop()
+    await AsyncDatabase.close()
+
+
 # Initialize FastAPI application
 app = FastAPI(
     title="NoteBot API",
     description="API for transcription and note-taking services.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Initialize Database
@@ -42,7 +65,7 @@ app.add_middleware(
 )
 
 # Include NoteBot Routes
-notebot_router = NoteBotRoute(None, None)  # Replace `None` with actual dependencies if required
+notebot_router = NoteBotRoute(ConnectionManager(), None)
 app.include_router(notebot_router.router, prefix="/api/notebot")
 
 
@@ -0,0 +1,76 @@
+import argparse
+import time
+
+from bson import ObjectId
+
+from database import Database, CallDetails, User
+
+
+def backfill_call_owner(owner: str, batch_size: int, pause: float, dry_run: bool = False):
+    """
+    Assign owner to every CallDetails document that has none, batch_size documents at a time.
+
+    Each batch is a short update_many over an _id range, so the collection is never locked for
+    long and the API keeps serving requests while the backfill runs. Safe to stop and re-run:
+    documents that already have an owner are never touched.
+    """
+    collection = CallDetails._get_collection()
+    unowned = {"$or": [{"owner": {"$exists": False}}, {"owner": None}]}
+    updated = 0
+    last_id = None
+
+    while True:
+        query = dict(unowned, **({"_id": {"$gt": last_id}} if last_id else {}))
+        ids = [document["_id"] for document in
+               collection.find(query, {"_id": 1}).sort("_id", 1).limit(batch_size)]
+        if not ids:
+            break
+        last_id = ids[-1]
+
+        if dry_run:
+            updated += len(ids)
+        else:
+            result = collection.update_many(dict(unowned, _id={"$in": ids}), {"$set": {"owner": owner}})
+            updated += result.modified_count
+        print(f"Backfilled {updated} calls (through {last_id})")
+
+        if pause:
+            time.sleep(pause)
+
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Assign an owner to calls saved before calls had owners.")
+    owner = parser.add_mutually_exclusive_group(required=True)
+    owner.add_argument("--owner-id", help="Id of the user to assign unowned calls to")
+    owner.add_argument("--owner-email", help="Email of the user to assign unowned calls to")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--pause", type=float, default=0.1, help="Seconds to sleep between batches")
+    parser.add_argument("--dry-run", action="store_true", help="Count the calls without updating them")
+    args = parser.parse_args()
+
+    Database()
+
+    if args.owner_email:
+        user = User.objects(email=args.owner_email).first()
+        if not user:
+            parser.error(f"No user with email {args.owner_email}")
+        owner_id = str(user.id)
+    else:
+        if not ObjectId.is_valid(args.owner_id) or not User.objects(id=args.owner_id).first():
+            parser.error(f"No user with id {args.owner_id}")
+        owner_id = args.owner_id
+
+    updated = backfill_call_owner(owner_id, args.batch_size, args.pause, args.dry_run)
+    print(f"{'Would backfill' if args.dry_run else 'Backfilled'} {updated} calls for owner {owner_id}")
+
+    # Build the (owner, date) indexes once the data is in place; MongoDB builds them without
+    # holding an exclusive lock on the collection
+    if not args.dry_run:
+        CallDetails.ensure_indexes()
+
+
+# Run from the repository root: python -m migrations.backfill_call_owner --owner-email you@example.com
+if __name__ == "__main__":
+    main()
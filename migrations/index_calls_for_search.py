@@ -0,0 +1,60 @@
+import argparse
+import asyncio
+
+from database import Database, AsyncDatabase, SearchEntry, CallDetailsRepository
+from services.call_service import CallService
+
+
+async def index_calls(batch_size: int, pause: float, dry_run: bool = False):
+    """
+    Build search entries for every stored call, batch_size calls at a time. Indexing a call
+    replaces its entries, so the migration can be stopped and re-run at any point.
+    """
+    calls = CallDetailsRepository()
+    call_service = CallService()
+    search_service = call_service.search_service
+    indexed = 0
+    last_id = None
+
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id else {}
+        batch = await calls.find(query, sort=[("_id", 1)], limit=batch_size)
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        if not dry_run:
+            for call in batch:
+                await search_service.index_call(call, await call_service.load_utterances(call))
+        indexed += len(batch)
+        print(f"Indexed {indexed} calls (through {last_id})")
+
+        if pause:
+            await asyncio.sleep(pause)
+
+    return indexed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index stored calls for /calls/search.")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--pause", type=float, default=0.1, help="Seconds to sleep between batches")
+    parser.add_argument("--dry-run", action="store_true", help="Count the calls without indexing them")
+    args = parser.parse_args()
+
+    Database()
+    SearchEntry.ensure_indexes()
+
+    async def run():
+        try:
+            return await index_calls(args.batch_size, args.pause, args.dry_run)
+        finally:
+            await AsyncDatabase.close()
+
+    indexed = asyncio.run(run())
+    print(f"{'Would index' if args.dry_run else 'Indexed'} {indexed} calls")
+
+
+# Run from the repository root: python -m migrations.index_calls_for_search
+if __name__ == "__main__":
+    main()
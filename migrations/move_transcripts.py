@@ -0,0 +1,55 @@
+import argparse
+import time
+
+from database import Database, CallDetails, Transcript
+
+
+def move_transcripts(batch_size: int, pause: float, dry_run: bool = False):
+    """
+    Move inline CallDetails.transcription values into the transcript collection, batch_size
+    calls at a time. Each transcript is upserted before the inline copy is unset, so the
+    migration can be stopped and re-run at any point without losing a transcript.
+    """
+    calls = CallDetails._get_collection()
+    transcripts = Transcript._get_collection()
+    inline = {"transcription.utterances": {"$exists": True}}
+    moved = 0
+    last_id = None
+
+    while True:
+        query = dict(inline, **({"_id": {"$gt": last_id}} if last_id else {}))
+        batch = list(calls.find(query, {"transcription": 1}).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+
+        if not dry_run:
+            for call in batch:
+                transcript = Transcript.from_utterances(call["_id"], call["transcription"]["utterances"])
+                transcripts.replace_one({"call_id": call["_id"]}, transcript.to_mongo(), upsert=True)
+            calls.update_many({"_id": {"$in": [call["_id"] for call in batch]}}, {"$unset": {"transcription": ""}})
+        moved += len(batch)
+        print(f"Moved {moved} transcripts (through {last_id})")
+
+        if pause:
+            time.sleep(pause)
+
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move inline call transcriptions into the transcript collection.")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--pause", type=float, default=0.1, help="Seconds to sleep between batches")
+    parser.add_argument("--dry-run", action="store_true", help="Count the calls without moving anything")
+    args = parser.parse_args()
+
+    Database()
+    Transcript.ensure_indexes()
+    moved = move_transcripts(args.batch_size, args.pause, args.dry_run)
+    print(f"{'Would move' if args.dry_run else 'Moved'} {moved} transcripts")
+
+
+# Run from the repository root: python -m migrations.move_transcripts
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
 from .base import BasePydanticModel
-from .call_details import CallDetailsModel
+from .call_details import CallDetailsModel, CallQuestionModel, QuestionTurnModel, NoteTypesRequestModel
 from .transcription import TranscriptionResponseModel, TokenUsageModel
-from .user import UserRegister, UserLogin
\ No newline at end of file
+from .user import UserRegister, UserLogin, TokenRefresh
@@ -1,24 +1,85 @@
 from datetime import datetime
+from typing import List, Optional, Dict
 
+from pydantic import Field
+
+from database import CallDetails, Participant, Transcript
 from . import BasePydanticModel
-from .transcription import TokenUsageModel
+from .transcription import TokenUsageModel, TranscriptionResponseModel
 
 
 class ParticipantModel(BasePydanticModel):
-    id: str
+    id: Optional[str] = None
     name: str
     role: str
     isHost: bool
-    additionalNotes: str
+    additionalNotes: Optional[str] = None
 
 
 class CallDetailsModel(BasePydanticModel):
+    owner: Optional[str] = None  # Set by the API from the authenticated user, never by the client
     date: datetime
     callType: str
     notes: str
-    participants: list
+    participants: List[ParticipantModel]
     notetype: list
     minutes_elapsed: float
-    title: str
-    transcription: dict
-    token_usage: TokenUsageModel
+    title: Optional[str] = None
+    transcription: Optional[TranscriptionResponseModel] = None
+    note_type_responses: Optional[Dict[str, str]] = None
+    failed_note_types: Optional[List[str]] = None  # Note types that could not be generated; can be retried
+    token_usage: Optional[TokenUsageModel] = None
+
+    def save(self):
+        """
+        Save the Pydantic model to MongoDB as a CallDetails document.
+        """
+        document = self.to_document()
+        document.save()
+        transcript = self.to_transcript_document(document.id)
+        if transcript:
+            transcript.save()
+        print("Successfully saved to MongoDB.")
+        return document
+
+    def to_document(self):
+        """
+        Build the unsaved CallDetails document, e.g. for CallDetailsRepository.insert. Token
+        usage is embedded; the transcription is stored separately, see to_transcript_document.
+        """
+        participant_embeds = [Participant(**p.model_dump()) for p in self.participants]
+
+        return CallDetails(
+            owner=self.owner,
+            date=self.date,
+            callType=self.callType,
+            notes=self.notes,
+            notetype=self.notetype,
+            title=self.title,
+            minutes_elapsed=self.minutes_elapsed,
+            note_type_responses=self.note_type_responses,
+            failed_note_types=self.failed_note_types,
+            participants=participant_embeds,
+            cost=self.token_usage.to_document() if self.token_usage else None
+        )
+
+    def to_transcript_document(self, call_id):
+        # The unsaved Transcript for the call with id call_id, or None without a transcription
+        if not self.transcription:
+            return None
+        return Transcript.from_utterances(call_id, self.transcription.model_dump()["utterances"])
+
+
+class QuestionTurnModel(BasePydanticModel):
+    question: str
+    answer: str
+
+
+class CallQuestionModel(BasePydanticModel):
+    question: str = Field(..., min_length=1)
+    history: Optional[List[QuestionTurnModel]] = None  # Earlier questions about the same call, oldest first
+
+
+class NoteTypesRequestModel(BasePydanticModel):
+    note_types: List[str] = Field(..., min_length=1)  # e.g. keys of NOTE_TYPE_DESCRIPTORS
+    regenerate: bool = False  # Also replace note types the call already has
@@ -1,8 +1,8 @@
-from typing import List
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel
 
-from database import TokenUsage
+from database import CallCost
 
 
 class UtteranceModel(BaseModel):
@@ -17,17 +17,20 @@ class TranscriptionResponseModel(BaseModel):
 
 
 class TokenUsageModel(BaseModel):
+    model: Optional[str] = None  # Model the notes were generated with
     transcription_cost: float
     input_cost: float
     output_cost: float
     total_cost: float
+    note_types: Optional[Dict[str, dict]] = None  # Tokens and cost per note type, when generated separately
 
-    def save(self):
-        token_usage = TokenUsage(
+    def to_document(self):
+        # Embedded in the CallDetails document rather than stored on its own
+        return CallCost(
+            model=self.model,
             transcription_cost=self.transcription_cost,
             input_cost=self.input_cost,
             output_cost=self.output_cost,
-            total_cost=self.total_cost
+            total_cost=self.total_cost,
+            note_types=self.note_types
         )
-        token_usage.save()
-        return token_usage
@@ -10,3 +10,6 @@ class UserRegister(BaseModel):
 class UserLogin(BaseModel):
     email: EmailStr
     password: str
+
+class TokenRefresh(BaseModel):
+    refresh_token: str
@@ -1,73 +1,147 @@
 import json
-import os
-from typing import Optional
-from fastapi import APIRouter, Form, File, UploadFile, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, Form, File, UploadFile, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 
-from models import CallDetails, CallDetailsModel
+from database import Job
+from models import CallDetailsModel, CallQuestionModel, NoteTypesRequestModel
 
+from services.ask_service import AskService
+from services.auth_service import current_user_id
+from services.call_service import CallService
+from services.connection_manager import ConnectionManager
+from services.job_service import JobService
 from services.transcription_service import TranscriptionService
-
-UPLOAD_DIR = "./temp_chunks"  # Directory to store chunks
-sessions = {}  # Dictionary to keep track of sessions and associated data
+from services.upload_service import UploadService
+from settings import Config
 
 router = APIRouter()
+call_service = CallService()
 transcription_service = TranscriptionService()
+ask_service = AskService(call_service, transcription_service)
+connection_manager = ConnectionManager()
+job_service = JobService(transcription_service, connection_manager)
+upload_service = UploadService()
 
 @router.get("/calls")
-async def get_all_call_details():
+async def get_all_call_details(
+    cursor: Optional[str] = None,
+    limit: int = Config.CALLS_PAGE_SIZE,
+    start_date: Optional[float] = None,
+    end_date: Optional[float] = None,
+    call_type: Optional[str] = None,
+    note_type: Optional[str] = None,
+    user_id: str = Depends(current_user_id)
+):
     try:
-        call_details_list = CallDetails.objects.all()
-        call_details_dicts = [call_detail.to_dict() for call_detail in call_details_list]
-        return {"call_details": call_details_dicts}
+        return await call_service.list_calls(user_id, cursor, limit, start_date, end_date, call_type, note_type)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error retrieving call details: {str(e)}")
         raise HTTPException(status_code=500, detail="Error retrieving call details")
 
+@router.get("/calls/search")
+async def search_calls(q: str, mode: str = "text", limit: int = Config.SEARCH_RESULT_LIMIT,
+                       user_id: str = Depends(current_user_id)):
+    return await call_service.search_service.search(user_id, q, mode, limit)
+
+@router.get("/calls/{call_id}")
+async def get_call_details(call_id: str, user_id: str = Depends(current_user_id)):
+    return await call_service.get_call(user_id, call_id)
+
+@router.post("/calls/{call_id}/ask")
+async def ask_about_call(call_id: str, request: CallQuestionModel, user_id: str = Depends(current_user_id)):
+    return await ask_service.ask(user_id, call_id, request)
+
+@router.post("/calls/{call_id}/notes")
+async def add_call_notes(call_id: str, request: NoteTypesRequestModel, user_id: str = Depends(current_user_id)):
+    return await transcription_service.add_note_types(user_id, call_id, request.note_types, request.regenerate)
+
+@router.post("/calls/import")
+async def import_call_details(calls: List[CallDetailsModel], user_id: str = Depends(current_user_id)):
+    return await call_service.import_calls(user_id, calls)
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0, user_id: str = Depends(current_user_id)):
+    if wait > 0:
+        job = await job_service.wait_for_job(job_id, wait, user_id)
+    else:
+        job = await job_service.get_job(job_id, user_id)
+    return job.to_dict()
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, user_id: str = Depends(current_user_id)):
+    events = await job_service.stream_events(job_id, user_id)
+    return StreamingResponse(events, media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.get("/upload_status/{session_id}")
+async def get_upload_status(session_id: str, user_id: str = Depends(current_user_id)):
+    status = await upload_service.get_status(session_id, user_id)
+    if status:
+        return status
+
+    job = await job_service.find_session_job(session_id)
+    if job and job.owner == user_id:
+        return {"session_id": session_id, "complete": True, "missing_chunks": [], "job_id": str(job.id)}
+    raise HTTPException(status_code=404, detail="Upload session not found")
+
 @router.post("/upload_call_details")
 async def upload_call_details(
     session_id: str = Form(...),
     chunk_index: int = Form(...),
     total_chunks: int = Form(...),
     call_details: Optional[str] = Form(None),
-    file: UploadFile = File(...)
+    checksum: Optional[str] = Form(None),
+    priority: Optional[str] = Form(None),
+    file: UploadFile = File(...),
+    user_id: str = Depends(current_user_id)
 ):
     try:
-        os.makedirs(UPLOAD_DIR, exist_ok=True)
-        session_path = os.path.join(UPLOAD_DIR, session_id)
-        os.makedirs(session_path, exist_ok=True)
-
-        if call_details and session_id not in sessions:
-            call_details_dict = json.loads(call_details)
-            sessions[session_id] = {
-                "call_details": call_details_dict,
-                "received_chunks": 0,
-            }
-
-        chunk_path = os.path.join(session_path, f"chunk_{chunk_index}")
-        with open(chunk_path, "wb") as chunk_file:
-            chunk_file.write(await file.read())
-        sessions[session_id]["received_chunks"] += 1
-
-        if sessions[session_id]["received_chunks"] == total_chunks:
-            final_path = os.path.join(UPLOAD_DIR, f"{session_id}.m4a")
-            with open(final_path, "wb") as final_file:
-                for i in range(total_chunks):
-                    chunk_file_path = os.path.join(session_path, f"chunk_{i}")
-                    with open(chunk_file_path, "rb") as chunk:
-                        final_file.write(chunk.read())
-
-            call_details_dict = sessions[session_id]["call_details"]
-            call_details_model = CallDetailsModel(**call_details_dict)
-            result = await transcription_service.transcribe_audio(call_details_model, final_path)
-
-            for i in range(total_chunks):
-                os.remove(os.path.join(session_path, f"chunk_{i}"))
-            os.rmdir(session_path)
-            del sessions[session_id]
-
-            return {"message": "File assembled and processed successfully", "data": result}
+        existing_job = await job_service.find_session_job(session_id)
+        if existing_job:
+            if existing_job.owner != user_id:
+                raise HTTPException(status_code=404, detail="Upload session not found")
+            return {"message": "File already assembled and queued for processing", "job_id": str(existing_job.id)}
+
+        if priority is not None and priority not in Job.PRIORITIES:
+            raise HTTPException(status_code=400, detail=f"priority must be one of {', '.join(Job.PRIORITIES)}")
+
+        call_details_dict = json.loads(call_details) if call_details else None
+        if call_details_dict is not None:
+            call_details_dict["owner"] = user_id
+            try:
+                CallDetailsModel(**call_details_dict)
+            except ValidationError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid call details: {str(e)}")
+            call_details_dict["priority"] = priority or Job.IMMEDIATE
+        session, duplicate, ready = await upload_service.receive_chunk(
+            session_id, chunk_index, total_chunks, file, call_details_dict, checksum, user_id
+        )
+
+        if ready:
+            try:
+                final_path = await upload_service.assemble(session_id, session["total_chunks"])
+
+                call_details_dict = dict(session["call_details"])
+                job_priority = call_details_dict.pop("priority", Job.IMMEDIATE)
+                CallDetailsModel(**call_details_dict)
+                job = await job_service.enqueue(session_id, call_details_dict, final_path, job_priority, user_id)
+            except Exception:
+                await upload_service.release(session_id)
+                raise
+
+            await upload_service.finish(session_id)
+
+            return {"message": "File assembled and queued for processing", "job_id": str(job.id)}
 
+        if duplicate:
+            return {"message": f"Chunk {chunk_index + 1} was already received"}
         return {"message": f"Chunk {chunk_index + 1} received successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error during chunk upload: {str(e)}")
         raise HTTPException(status_code=400, detail="Failed to upload chunk")
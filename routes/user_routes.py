@@ -1,5 +1,5 @@
 from fastapi import APIRouter, HTTPException
-from models import UserRegister, UserLogin
+from models import UserRegister, UserLogin, TokenRefresh
 from services.auth_service import AuthService
 
 router = APIRouter()
@@ -23,3 +23,7 @@ async def login_user(user: UserLogin):
     except Exception as e:
         print(f"Error during login: {str(e)}")
         raise HTTPException(status_code=500, detail="Error during login")
+
+@router.post("/refresh")
+async def refresh_tokens(request: TokenRefresh):
+    return await AuthService.refresh_tokens(request)
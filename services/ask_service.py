@@ -0,0 +1,122 @@
+import asyncio
+from collections import OrderedDict
+
+from fastapi import HTTPException
+
+from database import SearchEntry
+from models import CallQuestionModel
+from services.call_service import CallService
+from settings import Config
+
+
+class AskService:
+    """
+    Answers questions about one call from the transcript windows most relevant to each question,
+    instead of resending the whole transcript.
+
+    Windows are embedded when the call is indexed (with SEARCH_EMBEDDINGS_ENABLED) or, for
+    calls indexed without embeddings, on their first question; the vectors are stored on the
+    search entries and the most recently asked calls keep theirs in memory as one matrix.
+    """
+
+    def __init__(self, call_service: CallService, transcription_service):
+        self.call_service = call_service
+        self.search_service = call_service.search_service
+        self.transcription_service = transcription_service
+        self._windows = OrderedDict()  # call id -> (window entries, matrix), least recently asked first
+        self._locks = {}
+
+    async def ask(self, owner: str, call_id: str, request: CallQuestionModel):
+        call = await self.call_service.find_call(owner, call_id)
+        embedding_service = self.search_service.embedding_service
+        if not embedding_service.available():
+            raise HTTPException(status_code=400, detail="Questions about calls are unavailable on this server")
+
+        windows, matrix = await self.load_windows(call)
+        if not windows:
+            raise HTTPException(status_code=400, detail="This call has no transcript")
+
+        vector = (await embedding_service.embed([request.question]))[0]
+        scores = matrix @ vector
+        top = sorted(scores.argsort()[::-1][:Config.ASK_TOP_K])  # Most relevant windows, in transcript order
+        sources = [dict(windows[index], score=round(float(scores[index]), 4)) for index in top]
+
+        answer, token_usage = await self.transcription_service.complete(
+            self.build_system_message(call, sources), self.build_user_message(request)
+        )
+        input_cost, output_cost = self.transcription_service.token_cost(token_usage, Config.NOTE_MODEL)
+        return {
+            "answer": answer,
+            "sources": sources,
+            "token_usage": dict(token_usage, model=Config.NOTE_MODEL, cost=input_cost + output_cost),
+        }
+
+    async def load_windows(self, call):
+        # ([{text, start, end}], unit vector matrix) for the call's windows, embedding them on first use
+        if call.id in self._windows:
+            self._windows.move_to_end(call.id)
+            return self._windows[call.id]
+
+        lock = self._locks.setdefault(call.id, asyncio.Lock())
+        try:
+            async with lock:
+                # Held in a local: with a small ASK_CACHE_CALLS the entry may be evicted straight away
+                windows = self._windows.get(call.id)
+                if windows is None:
+                    windows = self._windows[call.id] = await self._read_windows(call)
+                    while len(self._windows) > Config.ASK_CACHE_CALLS:
+                        self._windows.popitem(last=False)
+        finally:
+            self._locks.pop(call.id, None)
+        return windows
+
+    async def _read_windows(self, call):
+        embedding_service = self.search_service.embedding_service
+        query = {"call_id": call.id, "kind": SearchEntry.WINDOW}
+        entries = await self.search_service.entries.find(query, sort=[("start", 1)])
+        if not entries:
+            # Calls stored before search existed are indexed now
+            utterances = await self.call_service.load_utterances(call)
+            if not utterances:
+                return [], None
+            await self.search_service.index_call(call, utterances)
+            entries = await self.search_service.entries.find(query, sort=[("start", 1)])
+
+        missing = [entry for entry in entries if not entry.embedding]
+        if missing:
+            vectors = await embedding_service.embed([entry.text for entry in missing])
+            embeddings = {entry.id: embedding_service.to_bytes(vector) for entry, vector in zip(missing, vectors)}
+            await self.search_service.entries.set_embeddings(embeddings)
+            for entry in missing:
+                entry.embedding = embeddings[entry.id]
+
+        windows = [{"text": entry.text, "start": entry.start, "end": entry.end} for entry in entries]
+        matrix = embedding_service.stack([embedding_service.from_bytes(entry.embedding) for entry in entries])
+        return windows, matrix
+
+    @staticmethod
+    def build_system_message(call, sources: list):
+        excerpts = "\n\n".join(
+            f"[{AskService.timestamp(source['start'])}-{AskService.timestamp(source['end'])}]\n{source['text']}"
+            for source in sources
+        )
+        return f"""
+        You answer questions about a recorded {call.callType}{f' titled {call.title!r}' if call.title else ''}.
+        Below are the parts of its transcript most relevant to the question, each headed by its time range.
+        Answer only from these excerpts, and cite the time ranges you relied on. If they do not contain
+        the answer, say so rather than guessing.
+
+        {excerpts}
+        """
+
+    @staticmethod
+    def build_user_message(request: CallQuestionModel):
+        # Recent turns only, so follow-up questions stay cheap
+        turns = (request.history or [])[-Config.ASK_HISTORY_TURNS:] if Config.ASK_HISTORY_TURNS else []
+        earlier = "".join(f"Earlier question: {turn.question}\nEarlier answer: {turn.answer}\n\n" for turn in turns)
+        return f"{earlier}Question: {request.question}"
+
+    @staticmethod
+    def timestamp(milliseconds: int):
+        seconds = (milliseconds or 0) // 1000
+        return f"{seconds // 60:02d}:{seconds % 60:02d}"
@@ -0,0 +1,87 @@
+import asyncio
+import os
+import shutil
+import tempfile
+from contextlib import asynccontextmanager
+from typing import NamedTuple
+
+from settings import Config
+
+
+class AudioSegment(NamedTuple):
+    index: int
+    path: str
+    start: float  # Offset of the segment in the original recording, in seconds
+    length: float  # Segment length in seconds, including any overlap with the next one
+
+
+class AudioSplitError(Exception):
+    pass
+
+
+class AudioSplitter:
+    """
+    Cuts recordings into segments with ffmpeg subprocesses.
+
+    Every split works in its own temporary directory, so concurrent jobs never see each
+    other's files, and ffmpeg runs as an asyncio subprocess so the event loop stays free.
+    """
+
+    # Caps ffmpeg processes across all splits running in this process
+    semaphore = asyncio.Semaphore(Config.AUDIO_SPLIT_CONCURRENCY)
+
+    def __init__(self, work_dir: str = Config.AUDIO_WORK_DIR):
+        self.work_dir = work_dir
+
+    @asynccontextmanager
+    async def split(self, file_location: str, plan: list, progress_callback=None):
+        """
+        Cut file_location into the (start, length) segments of plan and yield them in order
+        as AudioSegment tuples. The segment files are deleted when the context exits.
+        progress_callback, if given, is awaited with (segments_done, segments_total).
+        """
+        if self.work_dir:
+            os.makedirs(self.work_dir, exist_ok=True)
+        temp_dir = tempfile.mkdtemp(prefix="split_", dir=self.work_dir)
+        try:
+            segments = [
+                AudioSegment(index, os.path.join(temp_dir, f"segment_{index:03d}.m4a"), start, length)
+                for index, (start, length) in enumerate(plan)
+            ]
+            for segment in segments:
+                await self._cut(file_location, segment)
+                if progress_callback:
+                    await progress_callback(segment.index + 1, len(segments))
+            yield segments
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    async def probe_duration(self, file_location: str):
+        # Duration in seconds from ffprobe, or None if it cannot be determined
+        try:
+            returncode, stdout, _ = await self._run(
+                "ffprobe", "-v", "error", "-show_entries", "format=duration",
+                "-of", "default=noprint_wrappers=1:nokey=1", file_location
+            )
+            return float(stdout.strip()) if returncode == 0 else None
+        except (OSError, ValueError) as e:
+            print(f"Could not probe duration of {file_location}: {str(e)}")
+            return None
+
+    async def _cut(self, file_location: str, segment: AudioSegment):
+        # Arguments are passed as a list, so paths are never interpreted by a shell
+        returncode, _, stderr = await self._run(
+            "ffmpeg", "-nostdin", "-y", "-v", "error",
+            "-ss", f"{segment.start:.3f}", "-t", f"{segment.length:.3f}",
+            "-i", file_location, "-c", "copy", segment.path
+        )
+        if returncode != 0:
+            raise AudioSplitError(f"ffmpeg failed on segment {segment.index}: {stderr.strip()[-500:]}")
+
+    async def _run(self, *command):
+        async with self.semaphore:
+            process = await asyncio.create_subprocess_exec(
+                *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+            )
+            stdout, stderr = await process.communicate()
+        return process.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace")
@@ -1,12 +1,19 @@
 # auth_service.py
 
-from fastapi import HTTPException, status
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
-from models import UserRegister, UserLogin
-from database import User
-from utils import pwd_context
+from fastapi import HTTPException, Header, status
 
+from models import UserRegister, UserLogin, TokenRefresh
+from database import User, UserRepository
+from settings import Config
+from utils import pwd_context, issue_token, verify_token, InvalidToken, ACCESS_TOKEN, REFRESH_TOKEN
 
+# bcrypt is deliberately slow (~250 ms of CPU per call), so hashing and verification run on a
+# small dedicated pool; a burst of logins then queues there instead of stalling the event loop
+password_executor = ThreadPoolExecutor(max_workers=Config.PASSWORD_HASH_CONCURRENCY, thread_name_prefix="bcrypt")
+users = UserRepository()
 
 
 class AuthService:
@@ -14,14 +21,14 @@ class AuthService:
     async def register_user(user: UserRegister):
         try:
             # Check if the user already exists
-            if User.objects(email=user.email).first():
+            if await users.find_by_email(user.email):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Email already registered"
                 )
 
             # Hash the password
-            hashed_password = pwd_context.hash(user.password)
+            hashed_password = await AuthService.run_password_task(pwd_context.hash, user.password)
 
             # Create and save a new User document in MongoDB
             new_user = User(
@@ -30,7 +37,14 @@ class AuthService:
                 full_name=user.full_name,
                 phone_number=user.phone_number
             )
-            new_user.save()
+            try:
+                await users.insert(new_user)
+            except ValueError:
+                # Another request registered the same email since the check above
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Email already registered"
+                )
 
             return {"msg": "User registered successfully", "user_id": str(new_user.id)}
 
@@ -50,7 +64,7 @@ class AuthService:
     async def login_user(user: UserLogin):
         try:
             # Find the user by email
-            existing_user = User.objects(email=user.email).first()
+            existing_user = await users.find_by_email(user.email)
             if not existing_user:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -58,13 +72,14 @@ class AuthService:
                 )
 
             # Verify password
-            if not pwd_context.verify(user.password, existing_user.hashed_password):
+            if not await AuthService.run_password_task(pwd_context.verify, user.password,
+                                                       existing_user.hashed_password):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Invalid credentials: incorrect password"
                 )
 
-            return {"msg": "Login successful", "user_id": str(existing_user.id)}
+            return {"msg": "Login successful", **AuthService.issue_tokens(str(existing_user.id))}
 
         except HTTPException as http_exc:
             # Directly raise the HTTPException if already defined
@@ -77,3 +92,45 @@ class AuthService:
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to login due to an unexpected error. Please try again later."
             )
+
+
+    @staticmethod
+    async def refresh_tokens(request: TokenRefresh):
+        # Trade a valid refresh token for a new token pair, without re-entering the password
+        try:
+            user_id = verify_token(request.refresh_token, REFRESH_TOKEN)
+        except InvalidToken as e:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
+        return AuthService.issue_tokens(user_id)
+
+    @staticmethod
+    def issue_tokens(user_id: str):
+        return {
+            "user_id": user_id,
+            "access_token": issue_token(user_id, ACCESS_TOKEN, Config.ACCESS_TOKEN_TTL_SECONDS),
+            "refresh_token": issue_token(user_id, REFRESH_TOKEN, Config.REFRESH_TOKEN_TTL_SECONDS),
+            "token_type": "bearer",
+            "expires_in": Config.ACCESS_TOKEN_TTL_SECONDS,
+        }
+
+    @staticmethod
+    async def run_password_task(function, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(password_executor, function, *args)
+
+
+async def current_user_id(authorization: str = Header(None)):
+    """
+    FastAPI dependency returning the id of the user making the request, from the
+    "Authorization: Bearer <access token>" header. Only the token signature and expiry are
+    checked, so no database or bcrypt work is done per request.
+    """
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing access token",
+                            headers={"WWW-Authenticate": "Bearer"})
+    try:
+        return verify_token(token, ACCESS_TOKEN)
+    except InvalidToken as e:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e),
+                            headers={"WWW-Authenticate": "Bearer"})
@@ -0,0 +1,235 @@
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import NamedTuple, Optional
+
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion
+from starlette.concurrency import run_in_threadpool
+
+from database import Job
+from services.transcription_service import TranscriptionService
+from settings import Config
+
+
+client = AsyncOpenAI(api_key=Config.OPEN_API_KEY)
+
+
+class BatchResult(NamedTuple):
+    response: Optional[tuple]  # (raw_response, token_usage), or None if the request failed
+    error: Optional[str] = None
+
+
+class OpenAIBatchBackend:
+    """
+    OpenAI's Batch API: requests are uploaded as one JSONL file and answered within the completion
+    window at half the usual token rates.
+    """
+
+    FINISHED_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+    async def submit(self, requests: dict):
+        # {custom id: (system_message, user_message, model)} -> batch id
+        lines = [
+            json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": model,
+                    "temperature": 0,
+                    "messages": [
+                        {"role": "system", "content": system_message},
+                        {"role": "user", "content": user_message}
+                    ]
+                }
+            })
+            for custom_id, (system_message, user_message, model) in requests.items()
+        ]
+        input_file = await client.files.create(file=("requests.jsonl", "\n".join(lines).encode()), purpose="batch")
+        batch = await client.batches.create(input_file_id=input_file.id, endpoint="/v1/chat/completions",
+                                            completion_window=Config.BATCH_COMPLETION_WINDOW)
+        return batch.id
+
+    async def results(self, batch_id: str):
+        # {custom id: BatchResult} once the batch has finished, None while it is still running
+        batch = await client.batches.retrieve(batch_id)
+        if batch.status not in self.FINISHED_STATUSES:
+            return None
+
+        results = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            content = await client.files.content(file_id)
+            for line in content.text.splitlines():
+                if line.strip():
+                    item = json.loads(line)
+                    results[item["custom_id"]] = self.parse(item)
+        if batch.status != "completed":
+            print(f"Batch {batch_id} ended as {batch.status} with {len(results)} responses")
+        return results
+
+    @staticmethod
+    def parse(item: dict):
+        response = item.get("response") or {}
+        if item.get("error") or response.get("status_code") != 200:
+            return BatchResult(None, str(item.get("error") or response.get("body")))
+        completion = ChatCompletion.model_validate(response["body"])
+        text = (completion.choices[0].message.content or "").strip()
+        return BatchResult((text, TranscriptionService.usage_dict(completion.usage)))
+
+
+class LocalBatchBackend:
+    """
+    Stand-in for the batch API in development and tests: each batch is answered straight away
+    through complete (TranscriptionService.complete by default) and kept in memory until collected,
+    so batches do not survive a restart. Single process only: another process collecting the batch
+    would not find it and submit it again, see require_single_process_backend.
+    """
+
+    def __init__(self, complete=None):
+        self.complete = complete or TranscriptionService().complete
+        self._batches = {}
+
+    async def submit(self, requests: dict):
+        batch_id = f"local-{uuid.uuid4().hex}"
+        self._batches[batch_id] = asyncio.create_task(self._run(requests))
+        return batch_id
+
+    async def results(self, batch_id: str):
+        task = self._batches.get(batch_id)
+        if task is None:
+            raise KeyError(batch_id)
+        if not task.done():
+            return None
+        del self._batches[batch_id]
+        return task.result()
+
+    async def _run(self, requests: dict):
+        outcomes = await asyncio.gather(
+            *[self.complete(system_message, user_message, model=model)
+              for system_message, user_message, model in requests.values()],
+            return_exceptions=True
+        )
+        return {
+            custom_id: BatchResult(None, str(outcome)) if isinstance(outcome, Exception) else BatchResult(outcome)
+            for custom_id, outcome in zip(requests, outcomes)
+        }
+
+
+def require_single_process_backend():
+    # Called where batches may be collected by more than one process (worker.py, or the API when it
+    # leaves its jobs to worker.py); only the OpenAI backend's batches can be shared between processes
+    if Config.BATCH_BACKEND == "local":
+        raise RuntimeError("BATCH_BACKEND=local keeps batches in process memory; run the job workers in a "
+                           "single API process (JOB_WORKERS > 0, no worker.py) or use BATCH_BACKEND=openai")
+
+
+def create_batch_backend():
+    if Config.BATCH_BACKEND == "local":
+        return LocalBatchBackend()
+    return OpenAIBatchBackend()
+
+
+class BatchService:
+    """
+    Submits the note generation requests of deferred jobs in batches and finishes each job once
+    its batch has answered.
+
+    Jobs wait in the BATCHED stage. Every BATCH_SUBMIT_INTERVAL the pending requests are claimed
+    and submitted together; submitted batches are polled every BATCH_POLL_INTERVAL. A request the
+    batch did not answer is sent again on its own at the normal rate, so a deferred job never
+    loses its notes. Job queries run on the thread pool, as in JobService.
+    """
+
+    CLAIM_PREFIX = "claim-"  # batch_id of jobs being submitted, before the backend returns an id
+
+    def __init__(self, job_service, backend=None):
+        self.job_service = job_service
+        self.backend = backend or create_batch_backend()
+        self._task = None
+        self._last_submit = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def submit_pending(self):
+        # Claim the oldest unsubmitted requests so only one process submits each of them
+        claim = f"{self.CLAIM_PREFIX}{uuid.uuid4().hex}"
+        jobs = await run_in_threadpool(self._claim_pending, claim)
+        if not jobs:
+            return None
+
+        try:
+            batch_id = await self.backend.submit({
+                str(job.id): (job.batch_request["system_message"], job.batch_request["user_message"],
+                              job.batch_request.get("model", Config.NOTE_MODEL))
+                for job in jobs
+            })
+        except Exception:
+            await run_in_threadpool(Job.objects(batch_id=claim).update, set__batch_id=None)
+            raise
+        await run_in_threadpool(Job.objects(batch_id=claim).update, set__batch_id=batch_id,
+                                set__updated_at=datetime.now(timezone.utc))
+        print(f"Submitted {len(jobs)} deferred requests as batch {batch_id}")
+        return batch_id
+
+    async def collect(self):
+        # Release claims left by a process that stopped while submitting
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=Config.JOB_STALE_SECONDS)
+        await run_in_threadpool(
+            Job.objects(stage=Job.BATCHED, batch_id__startswith=self.CLAIM_PREFIX, updated_at__lt=cutoff).update,
+            set__batch_id=None
+        )
+
+        batch_ids = await run_in_threadpool(Job.objects(stage=Job.BATCHED, batch_id__ne=None).distinct, 'batch_id')
+        for batch_id in batch_ids:
+            if batch_id.startswith(self.CLAIM_PREFIX):
+                continue
+            try:
+                results = await self.backend.results(batch_id)
+            except KeyError:
+                # Unknown to the backend (e.g. a local batch lost in a restart); submit its requests again
+                await run_in_threadpool(Job.objects(stage=Job.BATCHED, batch_id=batch_id).update, set__batch_id=None)
+                continue
+            if results is None:
+                continue
+
+            jobs = await run_in_threadpool(lambda: list(Job.objects(stage=Job.BATCHED, batch_id=batch_id)))
+            for job in jobs:
+                result = results.get(str(job.id))
+                if result is None or result.response is None:
+                    print(f"Batch {batch_id} did not answer job {job.id}"
+                          f"{f': {result.error}' if result else ''}; generating its notes now")
+                await self.job_service.finish_batched(job, result.response if result else None)
+
+    @staticmethod
+    def _claim_pending(claim: str):
+        ids = [job.id for job in Job.objects(stage=Job.BATCHED, batch_id=None).order_by('created_at')
+               .only('id').limit(Config.BATCH_MAX_REQUESTS)]
+        if not ids:
+            return []
+        Job.objects(id__in=ids, stage=Job.BATCHED, batch_id=None).update(
+            set__batch_id=claim, set__updated_at=datetime.now(timezone.utc)
+        )
+        return list(Job.objects(batch_id=claim))
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.collect()
+                if self._last_submit is None or time.monotonic() - self._last_submit >= Config.BATCH_SUBMIT_INTERVAL:
+                    self._last_submit = time.monotonic()
+                    await self.submit_pending()
+            except Exception as e:
+                print(f"Error processing batches: {str(e)}")
+            await asyncio.sleep(Config.BATCH_POLL_INTERVAL)
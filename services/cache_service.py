@@ -0,0 +1,123 @@
+import hashlib
+import json
+from datetime import datetime, timezone
+
+from starlette.concurrency import run_in_threadpool
+
+from database import ResultCache, ResultCacheUsage
+from settings import Config
+
+
+class ResultCacheService:
+    """
+    Content-addressed cache for transcription and note generation results, so a re-uploaded
+    recording is not sent to AssemblyAI or OpenAI again. Least recently used entries are
+    evicted once the cache grows past RESULT_CACHE_MAX_BYTES. The cache size is a running total
+    kept with $inc on every write; it is only checked against the collection when it crosses
+    the limit, so concurrent writes can make it drift a little between evictions.
+    """
+
+    USAGE_ID = "total"  # The single ResultCacheUsage document
+    EVICTION_BATCH = 500  # Entries removed per delete
+
+    def __init__(self, enabled: bool = Config.RESULT_CACHE_ENABLED, max_bytes: int = Config.RESULT_CACHE_MAX_BYTES):
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+
+    async def hash_file(self, file_path: str):
+        return await run_in_threadpool(self._hash_file, file_path)
+
+    @staticmethod
+    def transcription_key(file_hash: str):
+        return f"transcription:{file_hash}"
+
+    @staticmethod
+    def meeting_minutes_key(transcription: dict, system_message: str, model: str, note_types: list,
+                            prompt_version: str):
+        # The system message carries the call context (participants, roles, notes), so calls that
+        # share a transcript but not their context never share notes
+        content = json.dumps(
+            {"transcription": transcription, "system_message": hashlib.sha256(system_message.encode()).hexdigest(),
+             "model": model, "note_types": sorted(note_types), "prompt_version": prompt_version},
+            sort_keys=True
+        )
+        return f"meeting_minutes:{hashlib.sha256(content.encode()).hexdigest()}"
+
+    async def get(self, key: str):
+        if not self.enabled:
+            return None
+        return await run_in_threadpool(self._get, key)
+
+    async def put(self, key: str, kind: str, payload: dict):
+        if not self.enabled:
+            return
+        try:
+            await run_in_threadpool(self._put, key, kind, payload)
+        except Exception as e:
+            # A cache write failure should never fail the job that produced the result
+            print(f"Failed to cache {key}: {str(e)}")
+
+    def _hash_file(self, file_path: str):
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as audio_file:
+            while block := audio_file.read(Config.UPLOAD_BLOCK_SIZE):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _get(self, key: str):
+        entry = ResultCache.objects(key=key).modify(
+            new=True, inc__hits=1, set__last_used_at=datetime.now(timezone.utc)
+        )
+        if entry:
+            print(f"Result cache hit for {key}")
+            return entry.payload
+        return None
+
+    def _put(self, key: str, kind: str, payload: dict):
+        now = datetime.now(timezone.utc)
+        size_bytes = len(json.dumps(payload, default=str))
+        # The entry as it was before this write, so an overwrite only adds the size difference
+        previous = ResultCache.objects(key=key).only('size_bytes').modify(
+            upsert=True,
+            new=False,
+            set__kind=kind,
+            set__payload=payload,
+            set__size_bytes=size_bytes,
+            set__last_used_at=now,
+            set_on_insert__created_at=now,
+            set_on_insert__hits=0
+        )
+        total_size = self._add_size(size_bytes - (previous.size_bytes if previous else 0))
+        if total_size > self.max_bytes:
+            self._evict()
+
+    def _add_size(self, delta: int):
+        usage = ResultCacheUsage.objects(id=self.USAGE_ID).modify(new=True, inc__size_bytes=delta)
+        if usage is None:
+            # No running total yet (e.g. a cache filled before it was kept): start it from the entries
+            usage = ResultCacheUsage.objects(id=self.USAGE_ID).modify(
+                upsert=True, new=True, set_on_insert__size_bytes=self._total_size()
+            )
+        return usage.size_bytes
+
+    @staticmethod
+    def _total_size():
+        totals = list(ResultCache.objects.aggregate([{"$group": {"_id": None, "size": {"$sum": "$size_bytes"}}}]))
+        return totals[0]["size"] if totals else 0
+
+    def _evict(self):
+        # Drop least recently used entries until the cache fits in max_bytes, correcting any drift
+        # in the running total against the collection first
+        total_size = self._total_size()
+        batch = []
+        for entry in ResultCache.objects.order_by('last_used_at').only('id', 'size_bytes'):
+            if total_size <= self.max_bytes:
+                break
+            batch.append(entry.id)
+            total_size -= entry.size_bytes
+            if len(batch) == self.EVICTION_BATCH:
+                ResultCache.objects(id__in=batch).delete()
+                batch = []
+        if batch:
+            ResultCache.objects(id__in=batch).delete()
+        ResultCacheUsage.objects(id=self.USAGE_ID).update_one(upsert=True, set__size_bytes=total_size)
@@ -0,0 +1,213 @@
+import base64
+import binascii
+import json
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError
+
+from database import CallDetails, CallDetailsRepository, TokenUsageRepository, TranscriptRepository
+from models import CallDetailsModel, TokenUsageModel
+from services.search_service import SearchService
+from settings import Config
+
+
+class CallService:
+    """
+    Call history queries, always scoped to the calls of one owner. Lists are paged with an
+    opaque cursor over (date, id), newest first, and leave out the transcription and note
+    responses, which only the detail view returns.
+    """
+
+    # Large fields that are only sent by get_call
+    LIST_EXCLUDED_FIELDS = ("transcription", "note_type_responses")
+
+    def __init__(self):
+        self.calls = CallDetailsRepository()
+        self.token_usages = TokenUsageRepository()
+        self.transcripts = TranscriptRepository()
+        self.search_service = SearchService()
+
+    async def list_calls(self, owner: str, cursor: Optional[str] = None, limit: int = Config.CALLS_PAGE_SIZE,
+                   start_date: Optional[float] = None, end_date: Optional[float] = None,
+                   call_type: Optional[str] = None, note_type: Optional[str] = None):
+        limit = max(1, min(limit, Config.CALLS_MAX_PAGE_SIZE))
+
+        query = {"owner": owner}
+        date_range = {}
+        if start_date is not None:
+            date_range["$gte"] = datetime.fromtimestamp(start_date, timezone.utc)
+        if end_date is not None:
+            date_range["$lt"] = datetime.fromtimestamp(end_date, timezone.utc)
+        if date_range:
+            query["date"] = date_range
+        if call_type:
+            query["callType"] = call_type
+        if note_type:
+            query["notetype"] = note_type
+        if cursor:
+            # Resume strictly after the last call of the previous page
+            cursor_date, cursor_id = self.decode_cursor(cursor)
+            query["$or"] = [{"date": {"$lt": cursor_date}}, {"date": cursor_date, "_id": {"$lt": cursor_id}}]
+
+        # Fetch one extra call to know whether another page follows
+        calls = await self.calls.find(
+            query,
+            projection={field: 0 for field in self.LIST_EXCLUDED_FIELDS},
+            sort=[("date", -1), ("_id", -1)],
+            limit=limit + 1
+        )
+        next_cursor = self.encode_cursor(calls[limit - 1]) if len(calls) > limit else None
+        calls = calls[:limit]
+
+        # Calls saved before cost was embedded reference their token usage; load all of those in one query
+        token_usages = await self.token_usages.find_by_ids(
+            call.to_mongo().get("token_usage") for call in calls if not call.cost
+        )
+        return {
+            "call_details": [self.summary_dict(call, token_usages) for call in calls],
+            "next_cursor": next_cursor,
+        }
+
+    async def find_call(self, owner: str, call_id: str):
+        # Another user's call is reported as missing rather than forbidden
+        call = await self.calls.find_one({"_id": ObjectId(call_id), "owner": owner}) \
+            if ObjectId.is_valid(call_id) else None
+        if not call:
+            raise HTTPException(status_code=404, detail="Call not found")
+        return call
+
+    async def load_utterances(self, call: CallDetails):
+        # The call's utterances, or None if it has no transcription
+        if call.transcription:
+            return call.transcription.get("utterances", [])
+        transcript = await self.transcripts.find_by_call_id(call.id)
+        return transcript.to_utterances() if transcript else None
+
+    async def get_call(self, owner: str, call_id: str):
+        call = await self.find_call(owner, call_id)
+        token_usages = await self.token_usages.find_by_ids([] if call.cost else [call.to_mongo().get("token_usage")])
+        # Older calls carry their transcription inline; newer ones keep it in the transcript collection
+        transcript = None if call.transcription else await self.transcripts.find_by_call_id(call.id)
+        return call.to_dict(token_usages, transcript)
+
+    async def store_call(self, call: CallDetailsModel, call_id=None):
+        """
+        Returns the stored CallDetails document and its Transcript (None without a transcription).
+        With call_id, e.g. the id of the job that produced the call, storing is idempotent: if a
+        call or transcript is already stored under that id, by an earlier or concurrent run, it is
+        kept and returned instead of being stored twice.
+        """
+        if call_id is None:
+            documents, transcripts = await self.store_calls([call])
+            return documents[0], transcripts[0]
+
+        document = call.to_document()
+        document.id = ObjectId(call_id)
+        transcript = call.to_transcript_document(document.id)
+        if transcript:
+            try:
+                await self.transcripts.insert(transcript)
+            except DuplicateKeyError:
+                transcript = await self.transcripts.find_by_call_id(document.id)
+        try:
+            await self.calls.insert(document)
+        except DuplicateKeyError:
+            print(f"Call {call_id} was already stored")
+            return await self.calls.find_one({"_id": document.id}), transcript
+
+        utterances = call.transcription.model_dump()["utterances"] if call.transcription else None
+        await self.search_service.index_call_safely(document, utterances)
+        return document, transcript
+
+    async def store_calls(self, calls: List[CallDetailsModel]):
+        """
+        Store calls with their transcripts, then index them for search. Transcripts are written
+        first, under ids assigned here, so a call is never visible without its transcript.
+        """
+        documents = [call.to_document() for call in calls]
+        for document in documents:
+            document.id = ObjectId()
+        transcripts = [call.to_transcript_document(document.id) for call, document in zip(calls, documents)]
+
+        stored_transcripts = [transcript for transcript in transcripts if transcript]
+        if len(stored_transcripts) == 1:
+            await self.transcripts.insert(stored_transcripts[0])
+        elif stored_transcripts:
+            await self.transcripts.insert_many(stored_transcripts)
+
+        if len(documents) == 1:
+            await self.calls.insert(documents[0])
+        else:
+            await self.calls.insert_many(documents)
+
+        for call, document in zip(calls, documents):
+            utterances = call.transcription.model_dump()["utterances"] if call.transcription else None
+            await self.search_service.index_call_safely(document, utterances)
+        return documents, transcripts
+
+    async def add_notes(self, call: CallDetails, responses: dict, cost: TokenUsageModel):
+        """
+        Merge generated note type responses into a stored call and add what they cost to the
+        call's cost, or to its TokenUsage document for calls saved before cost was embedded.
+        """
+        update = {
+            "$set": {f"note_type_responses.{note_type}": response for note_type, response in responses.items()},
+            "$addToSet": {"notetype": {"$each": list(responses)}},
+            "$pull": {"failed_note_types": {"$in": list(responses)}},
+        }
+        increments = {"input_cost": cost.input_cost, "output_cost": cost.output_cost, "total_cost": cost.total_cost}
+        legacy_token_usage = call.to_mongo().get("token_usage")
+        if call.cost:
+            update["$inc"] = {f"cost.{field}": value for field, value in increments.items()}
+            for note_type, usage in (cost.note_types or {}).items():
+                update["$set"][f"cost.note_types.{note_type}"] = usage
+        elif legacy_token_usage:
+            await self.token_usages.update_one({"_id": legacy_token_usage}, {"$inc": increments})
+        else:
+            update["$set"]["cost"] = cost.to_document().to_mongo()
+        await self.calls.update_one({"_id": call.id}, update)
+
+        call = await self.calls.find_one({"_id": call.id})
+        await self.search_service.index_call_safely(call, None)
+
+    async def import_calls(self, owner: str, calls: List[CallDetailsModel]):
+        """
+        Store already transcribed calls (e.g. historical recordings) for owner with one bulk insert
+        per collection.
+        """
+        if not calls:
+            raise HTTPException(status_code=400, detail="No calls to import")
+        if len(calls) > Config.CALLS_IMPORT_MAX_BATCH:
+            raise HTTPException(status_code=400,
+                                detail=f"At most {Config.CALLS_IMPORT_MAX_BATCH} calls can be imported at once")
+
+        for call in calls:
+            call.owner = owner
+        documents, _ = await self.store_calls(calls)
+        print(f"Imported {len(documents)} calls for {owner}")
+        return {"imported": len(documents), "ids": [str(document.id) for document in documents]}
+
+    def summary_dict(self, call: CallDetails, token_usages: dict):
+        # Excluded fields come back as empty defaults; drop them rather than send misleading empties
+        data = call.to_dict(token_usages)
+        for field in self.LIST_EXCLUDED_FIELDS:
+            data.pop(field, None)
+        return data
+
+    @staticmethod
+    def encode_cursor(call: CallDetails):
+        date = call.date.replace(tzinfo=timezone.utc) if call.date.tzinfo is None else call.date
+        payload = json.dumps({"date": date.isoformat(), "id": str(call.id)})
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str):
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return datetime.fromisoformat(payload["date"]), ObjectId(payload["id"])
+        except (binascii.Error, ValueError, KeyError, TypeError, InvalidId):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
@@ -0,0 +1,32 @@
+import asyncio
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class ConnectionManager:
+    """
+    In-process publish/subscribe of job events for streaming endpoints. Each open stream
+    subscribes to one job and gets its own queue; publishing never blocks the worker, and
+    a subscriber too slow to keep up loses its oldest events rather than stalling others.
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self.subscribers = defaultdict(set)
+
+    @contextmanager
+    def subscribe(self, job_id: str):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers[job_id].add(queue)
+        try:
+            yield queue
+        finally:
+            self.subscribers[job_id].discard(queue)
+            if not self.subscribers[job_id]:
+                del self.subscribers[job_id]
+
+    def publish(self, job_id: str, event: str, data: dict):
+        for queue in self.subscribers.get(job_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait((event, data))
@@ -0,0 +1,52 @@
+from openai import AsyncOpenAI
+
+from settings import Config
+
+try:
+    import numpy as np
+except ImportError:  # Optional dependency; semantic search and /ask are unavailable without it
+    np = None
+
+
+client = AsyncOpenAI(api_key=Config.OPEN_API_KEY)
+
+
+class EmbeddingService:
+    """
+    Text embeddings from OpenAI, stored as float32 bytes on SearchEntry documents.
+    Vectors are normalised to unit length, so a dot product is their cosine similarity.
+    """
+
+    def __init__(self, model: str = Config.EMBEDDING_MODEL):
+        self.model = model
+
+    @staticmethod
+    def available():
+        return np is not None
+
+    async def embed(self, texts: list):
+        # One normalised vector per text, requested in batches the API accepts
+        vectors = []
+        for start in range(0, len(texts), Config.EMBEDDING_BATCH_SIZE):
+            response = await client.embeddings.create(
+                model=self.model, input=texts[start:start + Config.EMBEDDING_BATCH_SIZE]
+            )
+            vectors.extend(self.normalize(np.array(item.embedding, dtype=np.float32)) for item in response.data)
+        return vectors
+
+    @staticmethod
+    def normalize(vector):
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    @staticmethod
+    def stack(vectors: list):
+        return np.vstack(vectors)
+
+    @staticmethod
+    def to_bytes(vector):
+        return vector.astype("<f4").tobytes()
+
+    @staticmethod
+    def from_bytes(data: bytes):
+        return np.frombuffer(data, dtype="<f4")
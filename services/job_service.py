@@ -0,0 +1,316 @@
+import asyncio
+import json
+import os
+import socket
+from contextlib import asynccontextmanager, nullcontext
+from datetime import datetime, timezone, timedelta
+
+from fastapi import HTTPException
+from mongoengine import ValidationError
+from starlette.concurrency import run_in_threadpool
+
+from database import Job
+from models import CallDetailsModel
+from settings import Config
+
+
+class JobService:
+    """
+    Durable transcription job queue backed by the Job collection.
+
+    Jobs are written to MongoDB before the upload request returns, so any process running
+    workers (the API itself or worker.py) can claim them, and a restart never loses one.
+    MongoEngine is synchronous, so every query runs on the thread pool, off the event loop.
+    """
+
+    def __init__(self, transcription_service, connection_manager=None):
+        self.transcription_service = transcription_service
+        self.connection_manager = connection_manager
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self._workers = []
+        self._wakeup = asyncio.Event()
+        self._last_requeue = None
+
+    async def enqueue(self, session_id: str, call_details: dict, file_path: str, priority: str = Job.IMMEDIATE,
+                      owner: str = None):
+        job = Job(session_id=session_id, owner=owner, call_details=call_details, file_path=file_path,
+                  priority=priority)
+        await run_in_threadpool(job.save)
+        print(f"Queued {priority} job {job.id} for session {session_id}")
+
+        # Wake an idle local worker instead of waiting for its next poll
+        self._wakeup.set()
+        return job
+
+    async def get_job(self, job_id: str, owner: str = None):
+        # With an owner, another user's job is reported exactly like a job that does not exist
+        try:
+            job = await run_in_threadpool(Job.objects(id=job_id).first)
+        except ValidationError:
+            job = None
+        if not job or (owner is not None and job.owner != owner):
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+
+    async def find_session_job(self, session_id: str):
+        # Job queued for a finished upload session, if any
+        return await run_in_threadpool(Job.objects(session_id=session_id).order_by('-created_at').first)
+
+    async def wait_for_job(self, job_id: str, timeout: float, owner: str = None):
+        # Long-poll: return as soon as the job is finished, or its current state once the timeout expires
+        deadline = asyncio.get_running_loop().time() + min(timeout, Config.JOB_LONG_POLL_MAX_SECONDS)
+        job = await self.get_job(job_id, owner)
+        while job.stage not in Job.TERMINAL_STAGES:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(remaining, Config.JOB_POLL_INTERVAL))
+            await run_in_threadpool(job.reload)
+        return job
+
+    async def stream_events(self, job_id: str, owner: str = None):
+        """
+        Server-sent events for one job: its current state, then every stage change, segment
+        progress update and generated note, then the final result. Events published by workers in this process
+        arrive immediately; the job document is also re-read periodically, so jobs running in
+        a separate worker process are followed too.
+        """
+        job = await self.get_job(job_id, owner)
+
+        async def events():
+            subscription = self.connection_manager.subscribe(str(job.id)) if self.connection_manager \
+                else nullcontext(asyncio.Queue())
+            with subscription as queue:
+                # Re-read after subscribing so no update falls between the two
+                await run_in_threadpool(job.reload)
+                yield self._sse("stage", {"stage": job.stage, "progress": job.progress or None})
+                if job.stage not in Job.TERMINAL_STAGES:
+                    # Notes generated before the client connected
+                    for note in self._notes(job.notes):
+                        yield self._sse("note", note)
+                while job.stage not in Job.TERMINAL_STAGES:
+                    last = (job.stage, job.progress)
+                    try:
+                        event, data = await asyncio.wait_for(queue.get(), timeout=Config.JOB_POLL_INTERVAL)
+                        yield self._sse(event, data)
+                        if event in ("result", "failed"):
+                            return
+                        await run_in_threadpool(job.reload)
+                    except asyncio.TimeoutError:
+                        await run_in_threadpool(job.reload)
+                        if (job.stage, job.progress) != last:
+                            yield self._sse("stage", {"stage": job.stage, "progress": job.progress or None})
+                        else:
+                            # Comment line so proxies and clients keep the connection open
+                            yield ": keepalive\n\n"
+
+                yield self._sse(*self._final_event(job))
+
+        return events()
+
+    def start(self, worker_count: int):
+        for index in range(worker_count):
+            self._workers.append(asyncio.create_task(self._worker_loop(index)))
+        print(f"Started {worker_count} job workers on {self.worker_id}")
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def requeue_stale_jobs(self):
+        # Jobs left mid-pipeline by a crashed worker are retried until they run out of attempts
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=Config.JOB_STALE_SECONDS)
+        # Batched jobs are idle by design while their batch runs
+        stale_jobs = await run_in_threadpool(
+            lambda: list(Job.objects(stage__nin=[Job.QUEUED, Job.BATCHED, *Job.TERMINAL_STAGES],
+                                     updated_at__lt=cutoff))
+        )
+        for job in stale_jobs:
+            if job.attempts >= Config.JOB_MAX_ATTEMPTS:
+                await self._update(job, stage=Job.FAILED, error="Job was interrupted too many times")
+            else:
+                await self._update(job, stage=Job.QUEUED)
+            print(f"Recovered stale job {job.id} as {job.stage}")
+        if stale_jobs:
+            self._wakeup.set()
+
+    async def _requeue_if_due(self):
+        # Workers take turns checking for stale jobs; the loop is single threaded, so only one runs each check
+        now = asyncio.get_running_loop().time()
+        if self._last_requeue is not None and now - self._last_requeue < Config.JOB_REQUEUE_INTERVAL:
+            return
+        self._last_requeue = now
+        await self.requeue_stale_jobs()
+
+    def _claim_next(self):
+        # Atomically move the oldest queued job to the first stage so only one worker gets it
+        return Job.objects(stage=Job.QUEUED).order_by('created_at').modify(
+            new=True,
+            set__stage=Job.UPLOADING,
+            set__worker_id=self.worker_id,
+            set__updated_at=datetime.now(timezone.utc),
+            inc__attempts=1
+        )
+
+    async def _worker_loop(self, index: int):
+        while True:
+            try:
+                await self._requeue_if_due()
+            except Exception as e:
+                print(f"Worker {index} failed to requeue stale jobs: {str(e)}")
+
+            try:
+                job = await run_in_threadpool(self._claim_next)
+            except Exception as e:
+                print(f"Worker {index} failed to claim a job: {str(e)}")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=Config.JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            print(f"Worker {index} processing job {job.id}")
+            await self._run(job)
+
+    async def _run(self, job):
+        async def report_stage(stage: str):
+            await self._update(job, stage=stage)
+            self._publish(job, "stage", {"stage": stage, "progress": None})
+
+        async def report_progress(phase: str, done: int, total: int):
+            progress = {"phase": phase, "done": done, "total": total}
+            await self._update(job, progress=progress)
+            self._publish(job, "progress", progress)
+
+        async def report_note(note: dict):
+            # Persist each note as it is generated, so it survives a dropped connection
+            notes = dict(job.notes or {})
+            if "title" in note:
+                notes["title"] = note["title"]
+            else:
+                notes.setdefault("note_type_responses", {})[note["note_type"]] = note["response"]
+            await self._update(job, notes=notes)
+            self._publish(job, "note", note)
+
+        async def defer(call_details: CallDetailsModel, request: dict):
+            # Keep the transcription with the job until the batch API answers
+            await self._update(job, stage=Job.BATCHED, call_details=call_details.model_dump(mode="json"),
+                         batch_request=request, batch_id=None)
+            self._publish(job, "stage", {"stage": Job.BATCHED, "progress": None})
+
+        try:
+            call_details_model = CallDetailsModel(**job.call_details)
+            # The call is stored under the job's id, so a job that is run again never stores it twice
+            async with self._heartbeat(job):
+                result = await self.transcription_service.transcribe_audio(
+                    call_details_model, job.file_path, stage_callback=report_stage, progress_callback=report_progress,
+                    note_callback=report_note, defer_callback=defer if job.priority == Job.DEFERRED else None,
+                    call_id=job.id
+                )
+            if result is None:
+                print(f"Job {job.id} is waiting for the batch API")
+                return
+            await self._update(job, stage=Job.COMPLETED, result=result)
+            print(f"Job {job.id} completed")
+        except Exception as e:
+            error = e.detail if isinstance(e, HTTPException) else str(e)
+            await self._update(job, stage=Job.FAILED, error=error)
+            print(f"Job {job.id} failed: {error}")
+        self._publish(job, *self._final_event(job))
+
+    async def finish_batched(self, job, response=None):
+        """
+        Store the call of a batched job from its batch response, (raw_response, token_usage), or
+        generate its notes now if the batch returned none. Only one process finishes each job.
+        """
+        job = await run_in_threadpool(
+            Job.objects(id=job.id, stage=Job.BATCHED).modify,
+            new=True, set__stage=Job.SUMMARIZING, set__updated_at=datetime.now(timezone.utc)
+        )
+        if job is None:
+            return
+
+        async def report_stage(stage: str):
+            await self._update(job, stage=stage)
+            self._publish(job, "stage", {"stage": stage, "progress": None})
+
+        try:
+            async with self._heartbeat(job):
+                result = await self.transcription_service.finish_deferred(
+                    CallDetailsModel(**job.call_details), job.batch_request, response, stage_callback=report_stage,
+                    call_id=job.id
+                )
+            await self._update(job, stage=Job.COMPLETED, result=result, batch_request={})
+            print(f"Job {job.id} completed from batch {job.batch_id}")
+        except Exception as e:
+            error = e.detail if isinstance(e, HTTPException) else str(e)
+            await self._update(job, stage=Job.FAILED, error=error)
+            print(f"Job {job.id} failed: {error}")
+        self._publish(job, *self._final_event(job))
+
+    @asynccontextmanager
+    async def _heartbeat(self, job):
+        # Touch the running job well within JOB_STALE_SECONDS, so only jobs whose worker died look stale
+        async def beat():
+            while True:
+                await asyncio.sleep(Config.JOB_STALE_SECONDS / 3)
+                try:
+                    await run_in_threadpool(
+                        Job.objects(id=job.id, stage__nin=[Job.QUEUED, Job.BATCHED, *Job.TERMINAL_STAGES]).update,
+                        set__updated_at=datetime.now(timezone.utc)
+                    )
+                except Exception as e:
+                    print(f"Failed to refresh job {job.id}: {str(e)}")
+
+        task = asyncio.create_task(beat())
+        try:
+            yield
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    def _publish(self, job, event: str, data: dict):
+        if self.connection_manager is not None:
+            self.connection_manager.publish(str(job.id), event, data)
+
+    @staticmethod
+    def _notes(notes: dict):
+        notes = notes or {}
+        if "title" in notes:
+            yield {"title": notes["title"]}
+        for note_type, response in notes.get("note_type_responses", {}).items():
+            yield {"note_type": note_type, "response": response}
+
+    @staticmethod
+    def _final_event(job):
+        if job.stage == Job.COMPLETED:
+            return "result", job.to_dict()
+        return "failed", job.to_dict()
+
+    @staticmethod
+    def _sse(event: str, data: dict):
+        return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+    async def _update(self, job, **fields):
+        fields["updated_at"] = datetime.now(timezone.utc)
+        await run_in_threadpool(job.update, **{f"set__{name}": value for name, value in fields.items()})
+        for name, value in fields.items():
+            setattr(job, name, value)
+        if fields.get("stage") in Job.TERMINAL_STAGES:
+            # A finished job is never run again, so its assembled audio is no longer needed
+            await run_in_threadpool(self._remove_file, job.file_path)
+
+    @staticmethod
+    def _remove_file(file_path: str):
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Failed to remove {file_path}: {str(e)}")
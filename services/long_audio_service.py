@@ -0,0 +1,176 @@
+import string
+from collections import Counter, defaultdict
+
+from settings import Config
+
+
+class LongAudioService:
+    """
+    Planning and merging for recordings transcribed as several overlapping segments.
+
+    Segments are cut by duration with a short overlap, transcribed independently, then
+    stitched back together: timestamps are rebased onto the full recording, speech heard
+    twice in an overlap is kept only once, and each segment's speaker labels are mapped
+    onto one consistent set of speakers.
+    """
+
+    @staticmethod
+    def plan_segments(duration_seconds: float, segment_seconds: float = Config.LONG_AUDIO_SEGMENT_SECONDS,
+                      overlap_seconds: float = Config.LONG_AUDIO_OVERLAP_SECONDS):
+        # Returns (start, length) pairs in seconds; each segment runs into the next by overlap_seconds
+        segments = []
+        start = 0.0
+        # A final stretch no longer than the overlap is already covered by the previous segment
+        while not segments or start < duration_seconds - overlap_seconds:
+            length = min(segment_seconds + overlap_seconds, duration_seconds - start)
+            segments.append((start, length))
+            start += segment_seconds
+        return segments
+
+    @staticmethod
+    def rebase(utterances: list, offset_ms: int):
+        # Shift a segment's utterance (and word) timestamps so they are relative to the full recording
+        rebased = []
+        for utterance in utterances:
+            utterance = dict(utterance, start=utterance["start"] + offset_ms, end=utterance["end"] + offset_ms)
+            if utterance.get("words"):
+                utterance["words"] = [dict(word, start=word["start"] + offset_ms, end=word["end"] + offset_ms)
+                                      for word in utterance["words"]]
+            rebased.append(utterance)
+        return rebased
+
+    @classmethod
+    def merge_segments(cls, segments: list):
+        """
+        Merge [(offset_ms, length_ms, utterances)] for consecutive segments into one utterance list.
+        Utterances must already be rebased. An utterance is a whole speaker turn and may run across
+        an overlap, so utterances are trimmed to the part each segment owns rather than dropped; with
+        word timestamps ("words") the cut is exact, otherwise the text is split in proportion to time.
+        """
+        merged = []
+        speaker_map_previous = {}
+        used_labels = set()
+
+        for index, (offset_ms, length_ms, utterances) in enumerate(segments):
+            # Map this segment's speakers onto the labels already in use
+            if index == 0:
+                speaker_map = {speaker: speaker for speaker in cls._speakers(utterances)}
+            else:
+                previous_utterances = segments[index - 1][2]
+                speaker_map = cls.reconcile_speakers(previous_utterances, utterances, speaker_map_previous,
+                                                     used_labels)
+            used_labels.update(speaker_map.values())
+
+            # Speech in an overlap appears in both segments; split ownership at its midpoint
+            lower = cls._boundary(segments[index - 1], offset_ms) if index > 0 else None
+            upper = cls._boundary(segments[index], segments[index + 1][0]) if index + 1 < len(segments) else None
+            for utterance in utterances:
+                trimmed = cls.trim(utterance, lower, upper)
+                if trimmed:
+                    merged.append(dict(trimmed, speaker=speaker_map[utterance["speaker"]]))
+
+            speaker_map_previous = speaker_map
+
+        return sorted(merged, key=lambda utterance: utterance["start"])
+
+    @staticmethod
+    def trim(utterance: dict, lower=None, upper=None):
+        """
+        The part of utterance spoken in [lower, upper) milliseconds (either bound may be None),
+        without its word list, or None if none of it is.
+        """
+        lower = float("-inf") if lower is None else lower
+        upper = float("inf") if upper is None else upper
+        result = {key: value for key, value in utterance.items() if key != "words"}
+        if utterance["start"] >= lower and utterance["end"] <= upper:
+            return result if utterance["start"] < upper else None
+
+        words = utterance.get("words")
+        if words:
+            kept = [word for word in words if lower <= word["start"] < upper]
+            if not kept:
+                return None
+            confidences = [word["confidence"] for word in kept if word.get("confidence") is not None]
+            return dict(result, start=kept[0]["start"], end=kept[-1]["end"],
+                        text=" ".join(word["text"] for word in kept),
+                        confidence=sum(confidences) / len(confidences) if confidences else utterance["confidence"])
+
+        # No word timestamps: keep the share of the words matching the share of the time inside the bounds
+        start, end = max(utterance["start"], lower), min(utterance["end"], upper)
+        duration = utterance["end"] - utterance["start"]
+        if duration <= 0:
+            return result if lower <= utterance["start"] < upper else None
+        tokens = utterance["text"].split()
+        first = round(len(tokens) * (start - utterance["start"]) / duration)
+        last = round(len(tokens) * (end - utterance["start"]) / duration)
+        if end <= start or first >= last:
+            return None
+        return dict(result, start=int(start), end=int(end), text=" ".join(tokens[first:last]))
+
+    @classmethod
+    def reconcile_speakers(cls, previous_utterances: list, utterances: list, previous_map: dict,
+                           used_labels: set):
+        """
+        Map the speaker labels of a segment onto the global labels of the segment before it,
+        by voting with the time each pair of speakers overlaps in the shared audio.
+        """
+        votes = defaultdict(Counter)
+        if previous_utterances and utterances:
+            # Only utterances near the shared audio can overlap in time
+            previous_end = max(previous["end"] for previous in previous_utterances)
+            current_start = min(utterance["start"] for utterance in utterances)
+            head = [utterance for utterance in utterances if utterance["start"] < previous_end]
+            tail = [previous for previous in previous_utterances if previous["end"] > current_start]
+        else:
+            head, tail = [], []
+
+        for utterance in head:
+            for previous in tail:
+                shared = min(utterance["end"], previous["end"]) - max(utterance["start"], previous["start"])
+                if shared > 0:
+                    votes[utterance["speaker"]][previous_map[previous["speaker"]]] += shared
+
+        speaker_map = {}
+        taken = set()
+        # Assign the strongest matches first so two local speakers never claim the same global one
+        ranked = sorted(
+            ((weight, local, global_label) for local, counter in votes.items()
+             for global_label, weight in counter.items()),
+            reverse=True
+        )
+        for weight, local, global_label in ranked:
+            if local not in speaker_map and global_label not in taken:
+                speaker_map[local] = global_label
+                taken.add(global_label)
+
+        # Speakers with no match in the overlap are new to the recording
+        for speaker in cls._speakers(utterances):
+            if speaker not in speaker_map:
+                speaker_map[speaker] = cls._next_label(used_labels | taken)
+                taken.add(speaker_map[speaker])
+        return speaker_map
+
+    @staticmethod
+    def _boundary(segment, next_offset_ms: int):
+        offset_ms, length_ms, _ = segment
+        return (next_offset_ms + offset_ms + length_ms) // 2
+
+    @staticmethod
+    def _speakers(utterances: list):
+        return list(dict.fromkeys(utterance["speaker"] for utterance in utterances))
+
+    @staticmethod
+    def _next_label(used_labels: set):
+        # A, B, ... Z, AA, AB, ... matching AssemblyAI's speaker labels
+        index = 0
+        while True:
+            label = ""
+            value = index
+            while True:
+                label = string.ascii_uppercase[value % 26] + label
+                value = value // 26 - 1
+                if value < 0:
+                    break
+            if label not in used_labels:
+                return label
+            index += 1
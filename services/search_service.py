@@ -0,0 +1,168 @@
+from typing import Optional
+
+from fastapi import HTTPException
+
+from database import SearchEntry, SearchEntryRepository, CallDetailsRepository
+from services.embedding_service import EmbeddingService
+from services.vector_index import VectorIndex
+from settings import Config
+
+
+class SearchService:
+    """
+    Search over the titles, notes and transcripts of an owner's calls.
+
+    Every stored call is indexed into SearchEntry documents: text mode ranks title, note and
+    utterance entries with MongoDB's text index, so utterance hits carry their timestamps;
+    semantic mode ranks embedded windows of the transcript (plus titles and notes) by cosine
+    similarity to the query. Transcripts themselves are stored compressed, so they are never
+    scanned at query time.
+    """
+
+    TEXT = "text"
+    SEMANTIC = "semantic"
+
+    # Relevance multipliers, so a title or note match outranks one passing mention in the transcript
+    KIND_WEIGHTS = {SearchEntry.TITLE: 2.0, SearchEntry.NOTE: 1.5, SearchEntry.UTTERANCE: 1.0, SearchEntry.WINDOW: 1.0}
+
+    def __init__(self, embedding_service: EmbeddingService = None, vector_index: VectorIndex = None):
+        self.entries = SearchEntryRepository()
+        self.calls = CallDetailsRepository()
+        self.embedding_service = embedding_service or EmbeddingService()
+        self.vector_index = vector_index or VectorIndex()
+
+    def embeddings_enabled(self):
+        return Config.SEARCH_EMBEDDINGS_ENABLED and self.embedding_service.available()
+
+    async def index_call(self, call, utterances: Optional[list]):
+        """
+        Replace the search entries of a stored CallDetails document. utterances are its transcript
+        (e.g. Transcript.to_utterances()); with None, only the title and note entries are rebuilt.
+        The entries are written before anything is embedded, so text search never waits on, or is
+        lost to, a failed embedding request.
+        """
+        kinds = [SearchEntry.TITLE, SearchEntry.NOTE]
+        if utterances is not None:
+            kinds += [SearchEntry.UTTERANCE, SearchEntry.WINDOW]
+
+        entries = []
+        if call.title:
+            entries.append(SearchEntry(kind=SearchEntry.TITLE, text=call.title))
+        for note_type, response in (call.note_type_responses or {}).items():
+            if response:
+                entries.append(SearchEntry(kind=SearchEntry.NOTE, note_type=note_type, text=response))
+        for utterance in utterances or []:
+            if utterance["text"]:
+                entries.append(SearchEntry(kind=SearchEntry.UTTERANCE, text=utterance["text"],
+                                           speaker=utterance["speaker"], start=utterance["start"],
+                                           end=utterance["end"]))
+        entries += [SearchEntry(kind=SearchEntry.WINDOW, **window) for window in self.windows(utterances or [])]
+        for entry in entries:
+            entry.owner = call.owner
+            entry.call_id = call.id
+
+        await self.entries.delete_many({"call_id": call.id, "kind": {"$in": kinds}})
+        if entries:
+            await self.entries.insert_many(entries)
+
+        if self.embeddings_enabled():
+            await self.embed_entries(call, entries)
+        return len(entries)
+
+    async def embed_entries(self, call, entries: list):
+        # Entries left unembedded are still found by text search, and /ask embeds them on demand.
+        # Single utterances are too short to embed usefully; windows stand in for them
+        embedded = [entry for entry in entries if entry.kind != SearchEntry.UTTERANCE]
+        if not embedded:
+            return
+        try:
+            vectors = await self.embedding_service.embed([entry.text for entry in embedded])
+            await self.entries.set_embeddings({
+                entry.id: self.embedding_service.to_bytes(vector) for entry, vector in zip(embedded, vectors)
+            })
+        except Exception as e:
+            print(f"Failed to embed search entries of call {call.id}: {str(e)}")
+
+    async def index_call_safely(self, call, utterances: Optional[list]):
+        # The call is already stored; a failed index only makes it unsearchable until reindexed
+        try:
+            await self.index_call(call, utterances)
+        except Exception as e:
+            print(f"Failed to index call {call.id} for search: {str(e)}")
+
+    @staticmethod
+    def windows(utterances: list, max_chars: int = Config.SEARCH_WINDOW_CHARS):
+        # Consecutive utterances as "A: text" lines, packed into windows of about max_chars
+        windows = []
+        lines = []
+        length = 0
+        start = None
+        end = None
+        for utterance in utterances:
+            line = f"{utterance['speaker']}: {utterance['text']}"
+            if lines and length + len(line) > max_chars:
+                windows.append({"text": "\n".join(lines), "start": start, "end": end})
+                lines, length, start = [], 0, None
+            lines.append(line)
+            length += len(line) + 1
+            start = utterance["start"] if start is None else start
+            end = utterance["end"]
+        if lines:
+            windows.append({"text": "\n".join(lines), "start": start, "end": end})
+        return windows
+
+    async def search(self, owner: str, query: str, mode: str = TEXT, limit: int = Config.SEARCH_RESULT_LIMIT):
+        query = query.strip()
+        if not query:
+            raise HTTPException(status_code=400, detail="Search query is empty")
+        limit = max(1, min(limit, Config.SEARCH_MAX_RESULT_LIMIT))
+
+        if mode == self.TEXT:
+            # Fetch extra matches so re-ranking by kind can promote titles and notes
+            matches = await self.entries.search_text(owner, query, SearchEntry.TEXT_KINDS, limit * 2)
+        elif mode == self.SEMANTIC:
+            matches = await self.semantic_matches(owner, query, limit)
+        else:
+            raise HTTPException(status_code=400, detail=f"Unknown search mode: {mode}")
+
+        ranked = sorted(((entry, score * self.KIND_WEIGHTS[entry.kind]) for entry, score in matches),
+                        key=lambda match: match[1], reverse=True)[:limit]
+        return {"results": await self.results(ranked)}
+
+    async def semantic_matches(self, owner: str, query: str, limit: int, call_id=None):
+        # (entry, cosine similarity) pairs for the embedded entries nearest to query
+        if not self.embeddings_enabled():
+            raise HTTPException(status_code=400, detail="Semantic search is not enabled")
+        vector = (await self.embedding_service.embed([query]))[0]
+        nearest = await self.vector_index.search(owner, vector, limit, call_id=call_id)
+
+        scores = dict(nearest)
+        entries = await self.entries.find({"_id": {"$in": list(scores)}}, projection={"embedding": 0})
+        found = {entry.id for entry in entries}
+        # Entries replaced by a reindex since the matrix was loaded
+        self.vector_index.discard(owner, set(scores) - found)
+        return [(entry, scores[entry.id]) for entry in entries]
+
+    async def results(self, ranked: list):
+        # Hits with the title and date of their call, loaded in one query
+        calls = await self.calls.find({"_id": {"$in": list({entry.call_id for entry, _ in ranked})}},
+                                      projection={"title": 1, "date": 1})
+        calls = {call.id: call for call in calls}
+        results = []
+        for entry, score in ranked:
+            call = calls.get(entry.call_id)
+            if call is None:
+                continue
+            results.append({
+                "call_id": str(entry.call_id),
+                "call_title": call.title,
+                "date": call.date,
+                "kind": entry.kind,
+                "note_type": entry.note_type,
+                "speaker": entry.speaker,
+                "text": entry.text,
+                "start": entry.start,
+                "end": entry.end,
+                "score": round(score, 4),
+            })
+        return results
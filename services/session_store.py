@@ -0,0 +1,195 @@
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+from mongoengine import NotUniqueError
+from pymongo import ReturnDocument
+from starlette.concurrency import run_in_threadpool
+
+from database import UploadSession
+from settings import Config
+from utils import ChunkBitmap
+
+
+class SessionStore:
+    """
+    Tracks chunked upload sessions: their call details, expected chunk count and the
+    chunk indices received so far. Sessions are plain dictionaries with the keys session_id,
+    owner, call_details, total_chunks, received_chunks (a ChunkBitmap), assembling and updated_at.
+    """
+
+    async def add_chunk(self, session_id: str, chunk_index: int, total_chunks: int, call_details: dict = None,
+                        owner: str = None):
+        """
+        Record a stored chunk (creating the session if needed) and return the updated session.
+        Call details are only kept from the first request that provides them, and the owner
+        from the request that created the session. If the session was created with a different
+        total_chunks, the chunk is not recorded and the session is returned unchanged.
+        """
+        raise NotImplementedError
+
+    async def get(self, session_id: str):
+        raise NotImplementedError
+
+    async def claim_assembly(self, session_id: str):
+        """
+        Return True for exactly one caller once a session is ready to be assembled.
+        """
+        raise NotImplementedError
+
+    async def release_assembly(self, session_id: str):
+        """
+        Give up a claim whose assembly failed, so a retried chunk can claim the session again.
+        """
+        raise NotImplementedError
+
+    async def delete(self, session_id: str):
+        raise NotImplementedError
+
+    async def pop_expired(self, ttl_seconds: int):
+        """
+        Remove sessions not updated within ttl_seconds and return their ids.
+        """
+        raise NotImplementedError
+
+
+class InMemorySessionStore(SessionStore):
+    # Only safe with a single API process; use MongoSessionStore when running several
+    def __init__(self):
+        self.sessions = {}
+        self.lock = asyncio.Lock()
+
+    async def add_chunk(self, session_id: str, chunk_index: int, total_chunks: int, call_details: dict = None,
+                        owner: str = None):
+        async with self.lock:
+            session = self.sessions.setdefault(session_id, {
+                "session_id": session_id,
+                "owner": owner,
+                "call_details": None,
+                "total_chunks": total_chunks,
+                "received_chunks": ChunkBitmap(total_chunks),
+                "assembling": False,
+            })
+            if session["total_chunks"] != total_chunks:
+                return self._copy(session)
+            if call_details and not session["call_details"]:
+                session["call_details"] = call_details
+            session["received_chunks"].add(chunk_index)
+            session["updated_at"] = datetime.now(timezone.utc)
+            return self._copy(session)
+
+    async def get(self, session_id: str):
+        async with self.lock:
+            session = self.sessions.get(session_id)
+            return self._copy(session) if session else None
+
+    async def claim_assembly(self, session_id: str):
+        async with self.lock:
+            session = self.sessions.get(session_id)
+            if not session or session["assembling"]:
+                return False
+            session["assembling"] = True
+            return True
+
+    async def release_assembly(self, session_id: str):
+        async with self.lock:
+            session = self.sessions.get(session_id)
+            if session:
+                session["assembling"] = False
+
+    async def delete(self, session_id: str):
+        async with self.lock:
+            self.sessions.pop(session_id, None)
+
+    async def pop_expired(self, ttl_seconds: int):
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=ttl_seconds)
+        async with self.lock:
+            expired = [sid for sid, session in self.sessions.items() if session["updated_at"] < cutoff]
+            for session_id in expired:
+                del self.sessions[session_id]
+            return expired
+
+    @staticmethod
+    def _copy(session: dict):
+        received = session["received_chunks"]
+        return dict(session, received_chunks=ChunkBitmap(received.total_chunks, received.words))
+
+
+class MongoSessionStore(SessionStore):
+    # Shared by every API process and replica through the existing 'notebot' connection
+    async def add_chunk(self, session_id: str, chunk_index: int, total_chunks: int, call_details: dict = None,
+                        owner: str = None):
+        return await run_in_threadpool(self._add_chunk, session_id, chunk_index, total_chunks, call_details, owner)
+
+    async def get(self, session_id: str):
+        document = await run_in_threadpool(UploadSession.objects(session_id=session_id).first)
+        return document.to_session() if document else None
+
+    async def claim_assembly(self, session_id: str):
+        claimed = await run_in_threadpool(
+            UploadSession.objects(session_id=session_id, assembling=False).modify,
+            set__assembling=True
+        )
+        return claimed is not None
+
+    async def release_assembly(self, session_id: str):
+        await run_in_threadpool(UploadSession.objects(session_id=session_id).update_one, set__assembling=False)
+
+    async def delete(self, session_id: str):
+        await run_in_threadpool(UploadSession.objects(session_id=session_id).delete)
+
+    async def pop_expired(self, ttl_seconds: int):
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=ttl_seconds)
+        return await run_in_threadpool(self._pop_expired, cutoff)
+
+    def _add_chunk(self, session_id: str, chunk_index: int, total_chunks: int, call_details: dict = None,
+                   owner: str = None):
+        # Store call details before the chunk so whichever request completes the set can see them
+        if call_details:
+            self._upsert(session_id, total_chunks, owner, set_on_insert__call_details=call_details)
+            UploadSession.objects(session_id=session_id, call_details__exists=False).update_one(
+                set__call_details=call_details
+            )
+
+        # Create the session with an empty bitmap, then set this chunk's bit atomically with $bit
+        # so concurrent or retried chunk requests never lose or double count each other
+        self._upsert(session_id, total_chunks, owner)
+        word, mask = ChunkBitmap.position(chunk_index)
+        raw_document = UploadSession._get_collection().find_one_and_update(
+            {"session_id": session_id, "total_chunks": total_chunks},
+            {"$bit": {f"chunk_words.{word}": {"or": mask}}},
+            return_document=ReturnDocument.AFTER
+        )
+        if raw_document is None:
+            # The session expects a different number of chunks; leave its bitmap alone
+            return UploadSession.objects(session_id=session_id).first().to_session()
+        return UploadSession._from_son(raw_document).to_session()
+
+    def _upsert(self, session_id: str, total_chunks: int, owner: str = None, **update):
+        now = datetime.now(timezone.utc)
+        update.update(
+            set__updated_at=now,
+            set_on_insert__owner=owner,
+            set_on_insert__total_chunks=total_chunks,
+            set_on_insert__chunk_words=[0] * ChunkBitmap.word_count(total_chunks),
+            set_on_insert__created_at=now,
+            set_on_insert__assembling=False
+        )
+        try:
+            return UploadSession.objects(session_id=session_id).modify(upsert=True, new=True, **update)
+        except NotUniqueError:
+            # Another request created the session at the same moment; apply the update to it
+            return UploadSession.objects(session_id=session_id).modify(new=True, **update)
+
+    def _pop_expired(self, cutoff):
+        expired = []
+        for document in UploadSession.objects(updated_at__lt=cutoff).only('session_id'):
+            # Re-check the cutoff so a session that just received a chunk is left alone
+            if UploadSession.objects(session_id=document.session_id, updated_at__lt=cutoff).delete():
+                expired.append(document.session_id)
+        return expired
+
+
+def create_session_store():
+    if Config.SESSION_STORE == "mongo":
+        return MongoSessionStore()
+    return InMemorySessionStore()
@@ -0,0 +1,163 @@
+from functools import lru_cache
+
+from settings import Config
+
+try:
+    import tiktoken
+except ImportError:  # Optional dependency; counts fall back to a character-based estimate
+    tiktoken = None
+
+
+def model_rates(model: str):
+    """
+    USD per token for model from Config.MODEL_PRICING, as input, cached_input (prompt tokens
+    served from OpenAI's prompt cache) and output. Shared with TranscriptionService.token_cost.
+    """
+    rates = Config.MODEL_PRICING.get(model)
+    if rates is None:
+        # Never fail a call over a missing price; it is billed at the default model's rates
+        print(f"No pricing configured for {model}, using {Config.NOTE_MODEL} rates")
+        rates = Config.MODEL_PRICING[Config.NOTE_MODEL]
+    return {
+        "input": rates["input"] / 1_000_000,
+        "cached_input": rates.get("cached_input", rates["input"]) / 1_000_000,
+        "output": rates["output"] / 1_000_000,
+    }
+
+
+def select_note_model(prompt_tokens: int):
+    # The default model for short transcripts, the long-context model for longer ones
+    return Config.NOTE_MODEL if prompt_tokens <= Config.NOTE_MODEL_MAX_TOKENS else Config.LONG_TRANSCRIPT_MODEL
+
+MESSAGE_OVERHEAD_TOKENS = 4  # Role and separator tokens the chat format adds per message
+PROMPT_OVERHEAD_TOKENS = 3  # Tokens priming the assistant's reply
+
+
+@lru_cache(maxsize=None)
+def load_encoding(model: str):
+    # Loaded once per process; tiktoken may need to download its BPE file the first time
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        print(f"Could not load tokenizer for {model}, estimating token counts: {str(e)}")
+        return None
+
+
+class TokenBudget:
+    """
+    Token counting and cost estimation for meeting_minutes prompts, so the service can
+    choose single-shot or windowed processing and enforce spend limits before calling OpenAI.
+    """
+
+    def __init__(self, model: str = Config.NOTE_MODEL):
+        self.model = model  # Only chooses the tokenizer; current OpenAI chat models share one
+
+    @property
+    def encoding(self):
+        # Resolved on first use so importing the service never touches the network
+        return load_encoding(self.model)
+
+    def count(self, text: str):
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        # Roughly four characters per token for English text
+        return len(text) // 4 + 1
+
+    def count_messages(self, system_message: str, user_message: str):
+        return (self.count(system_message) + self.count(user_message)
+                + 2 * MESSAGE_OVERHEAD_TOKENS + PROMPT_OVERHEAD_TOKENS)
+
+    @staticmethod
+    def compact_utterances(utterances: list):
+        """
+        Transcript lines as "A: text", merging consecutive utterances by the same speaker so
+        the speaker prefix is sent once per turn rather than once per utterance.
+        """
+        lines = []
+        previous_speaker = None
+        for utterance in utterances:
+            if utterance.speaker == previous_speaker:
+                lines[-1] = f"{lines[-1]} {utterance.text}"
+            else:
+                lines.append(f"{utterance.speaker}: {utterance.text}")
+            previous_speaker = utterance.speaker
+        return lines
+
+    def split_windows(self, blocks: list, max_tokens: int):
+        # Pack consecutive blocks (transcript lines or part summaries) into windows under max_tokens
+        windows = []
+        current = []
+        current_tokens = 0
+        for block in self._split_oversized(blocks, max_tokens):
+            block_tokens = self.count(block)
+            if current and current_tokens + block_tokens > max_tokens:
+                windows.append("\n".join(current))
+                current = []
+                current_tokens = 0
+            current.append(block)
+            current_tokens += block_tokens
+        if current:
+            windows.append("\n".join(current))
+        return windows
+
+    def plan(self, system_message: str, blocks: list, note_type_count: int, fan_out: bool = False):
+        """
+        Choose the model, decide between one request and windowed (map-reduce) processing and
+        estimate the cost. With fan_out, the final prompt is sent once per note type plus once for
+        the title; the estimate ignores prompt cache discounts, so it errs on the high side.
+        """
+        transcript = "\n".join(blocks)
+        prompt_tokens = self.count_messages(system_message, transcript)
+        model = select_note_model(prompt_tokens)
+        completion_tokens = Config.NOTE_TYPE_EXPECTED_OUTPUT_TOKENS * max(note_type_count, 1)
+        final_requests = note_type_count + 1 if fan_out else 1
+
+        if prompt_tokens <= Config.MEETING_MINUTES_WINDOW_TOKENS:
+            prompt_tokens *= final_requests
+            return {
+                "mode": "single",
+                "model": model,
+                "windows": 1,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "estimated_cost": self.estimate_cost(prompt_tokens, completion_tokens, model),
+            }
+
+        # Map requests send each window once; the reduce request sends one summary per window
+        window_tokens = Config.MEETING_MINUTES_WINDOW_TOKENS - self.count(system_message)
+        windows = len(self.split_windows(blocks, window_tokens))
+        summary_tokens = Config.WINDOW_SUMMARY_EXPECTED_TOKENS * windows
+        map_prompt_tokens = prompt_tokens + windows * (self.count(system_message) + 2 * MESSAGE_OVERHEAD_TOKENS)
+        reduce_prompt_tokens = (self.count_messages(system_message, "") + summary_tokens) * final_requests
+        return {
+            "mode": "windowed",
+            "model": model,
+            "windows": windows,
+            "prompt_tokens": map_prompt_tokens + reduce_prompt_tokens,
+            "completion_tokens": summary_tokens + completion_tokens,
+            "estimated_cost": self.estimate_cost(map_prompt_tokens + reduce_prompt_tokens,
+                                                 summary_tokens + completion_tokens, model),
+        }
+
+    @staticmethod
+    def estimate_cost(prompt_tokens: int, completion_tokens: int, model: str = Config.NOTE_MODEL):
+        rates = model_rates(model)
+        return prompt_tokens * rates["input"] + completion_tokens * rates["output"]
+
+    def _split_oversized(self, blocks: list, max_tokens: int):
+        # A single turn longer than a window is cut into window-sized pieces
+        for block in blocks:
+            if self.count(block) <= max_tokens:
+                yield block
+            elif self.encoding is not None:
+                tokens = self.encoding.encode(block, disallowed_special=())
+                for start in range(0, len(tokens), max_tokens):
+                    yield self.encoding.decode(tokens[start:start + max_tokens])
+            else:
+                step = max_tokens * 4
+                for start in range(0, len(block), step):
+                    yield block[start:start + step]
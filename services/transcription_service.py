@@ -1,16 +1,25 @@
+import asyncio
 import os
 import json
+from concurrent.futures import ThreadPoolExecutor
 from pprint import pprint
 
 from dotenv import load_dotenv
 from fastapi import HTTPException
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
 
 from models import CallDetailsModel, TokenUsageModel, TranscriptionResponseModel
+from services.audio_splitter import AudioSplitter
+from services.cache_service import ResultCacheService
+from services.call_service import CallService
+from services.long_audio_service import LongAudioService
+from services.token_budget import TokenBudget, model_rates
 from settings import Config
-from utils import NOTE_TYPE_DESCRIPTORS
+from utils import NOTE_TYPE_DESCRIPTORS, IncrementalJsonParser
 
 
-from openai import OpenAI
+from openai import AsyncOpenAI
 import assemblyai as aai
 
 # Load environment variables from .env file
@@ -20,15 +29,34 @@ load_dotenv()
 openai_api_key = Config.OPEN_API_KEY
 assemblyai_api_key = Config.ASSEMBLYAI_API_KEY
 
-client = OpenAI(api_key=openai_api_key)
+client = AsyncOpenAI(api_key=openai_api_key)
 aai.settings.api_key = assemblyai_api_key
 
+# The AssemblyAI SDK uploads and polls synchronously, so it runs on a bounded thread pool
+# instead of the event loop; OpenAI calls are natively async and only need a concurrency cap.
+assemblyai_executor = ThreadPoolExecutor(max_workers=Config.ASSEMBLYAI_CONCURRENCY, thread_name_prefix="assemblyai")
+openai_semaphore = asyncio.Semaphore(Config.OPENAI_CONCURRENCY)
+
+# Part of the note generation cache key; bump whenever the meeting_minutes prompts change
+PROMPT_VERSION = "1"
+
 
 class TranscriptionService:
     aai_config = aai.TranscriptionConfig(speaker_labels=True)
     transcriber = aai.Transcriber()
+    audio_splitter = AudioSplitter()
+    token_budget = TokenBudget()
+    result_cache = ResultCacheService()
+    call_service = CallService()
 
-    async def transcribe_audio(self, call_details: CallDetailsModel, file_path: str):
+    async def transcribe_audio(self, call_details: CallDetailsModel, file_path: str, stage_callback=None,
+                               progress_callback=None, note_callback=None, defer_callback=None, call_id=None):
+        """
+        Transcribe the recording, generate its notes and store the call. With defer_callback, notes
+        that are not cached are left to the batch API: the callback is awaited with the call details
+        (now holding the transcription) and the pending request, and None is returned; the call is
+        stored later by finish_deferred. With call_id, the call is stored under that id, at most once.
+        """
         print('starting transcribe audio')
         try:
             # Check if the file path exists
@@ -37,21 +65,31 @@ class TranscriptionService:
 
             print(f"Audio file found at: {file_path}")
 
-            # Check the file size
-            file_size = os.path.getsize(file_path)
-            file_size_gb = file_size / (1024 * 1024 * 1024)  # Convert file size to GB
+            # Check the recording length; fall back to the client's reported duration if ffprobe fails
+            duration_seconds = await self.audio_splitter.probe_duration(file_path) or call_details.minutes_elapsed * 60
 
-            print(f"File size: {file_size_gb:.2f} GB")
+            print(f"Duration: {duration_seconds / 60:.1f} minutes")
             print("*" * 20)
 
-            if file_size_gb > 2.0:
-                print("File size exceeds 2GB, using large file transcription")
-                # Step 1: Transcribe the large audio using the chunking method
-                transcription_model = await self.transcribe_large_file(file_path)
+            # The same recording uploaded again reuses its transcription instead of paying for it twice
+            transcription_key = self.result_cache.transcription_key(await self.result_cache.hash_file(file_path))
+            cached_transcription = await self.result_cache.get(transcription_key)
+            if cached_transcription:
+                print("Using cached transcription")
+                transcription_model = TranscriptionResponseModel(**cached_transcription)
+            elif duration_seconds > Config.LONG_AUDIO_THRESHOLD_SECONDS:
+                print("Recording is long, using parallel segmented transcription")
+                # Step 1: Transcribe the long audio as overlapping segments in parallel
+                await self.report_stage(stage_callback, "transcribing")
+                transcription_model = await self.transcribe_large_file(file_path, duration_seconds, progress_callback)
             else:
-                print("File size is within limit, using standard transcription")
+                print("Recording is within limit, using standard transcription")
                 # Step 1: Transcribe the audio using AssemblyAI
-                transcription_model = await self.transcribe_with_assemblyai(file_path)
+                transcription_model = await self.transcribe_with_assemblyai(
+                    file_path, submitted_callback=lambda: self.report_stage(stage_callback, "transcribing")
+                )
+            if not cached_transcription:
+                await self.result_cache.put(transcription_key, "transcription", transcription_model.model_dump())
 
             print("finished transcribing with AssemblyAI or large file method")
             print("*" * 20)
@@ -62,90 +100,446 @@ class TranscriptionService:
             print("*" * 20)
 
             print("starting meeting minutes")
-            # Step 2: Generate meeting minutes with note type responses
-            results, token_usage = await self.meeting_minutes(call_details)
+            await self.report_stage(stage_callback, "summarizing")
+            # Step 2: Generate meeting minutes with note type responses, unless this transcript was
+            # already summarised with the same note types and prompts. Tokenizing is CPU-bound, so the
+            # plan is computed once off the event loop and reused for generation. Deferred notes are
+            # always one combined request, so they are keyed by that mode whatever is configured.
+            per_type = Config.NOTE_GENERATION_MODE == "per_type" and not defer_callback
+            planned = await run_in_threadpool(self.plan_meeting_minutes, call_details, per_type)
+            minutes_key = self.result_cache.meeting_minutes_key(
+                transcription_model.model_dump(), self.final_system_message(call_details, per_type),
+                planned[2]["model"], call_details.notetype,
+                f"{PROMPT_VERSION}-{'per_type' if per_type else 'combined'}"
+            )
+            cached_minutes = await self.result_cache.get(minutes_key)
+            if cached_minutes:
+                print("Using cached meeting minutes")
+                # A cache hit costs nothing, so no tokens are billed to this call
+                results = cached_minutes["result"]
+                token_usage = {"total_tokens": 0, "prompt_tokens": 0, "completion_tokens": 0}
+                await self.report_notes(note_callback, results)
+            elif defer_callback:
+                # Only the final request is deferred; long transcripts are condensed now
+                system_message, transcript_content, token_usage = await self.prepare_meeting_minutes(
+                    call_details, planned=planned
+                )
+                await defer_callback(call_details, {
+                    "system_message": system_message,
+                    "user_message": transcript_content,
+                    "model": token_usage["model"],
+                    "token_usage": token_usage,
+                    "minutes_key": minutes_key,
+                    "transcription_cached": bool(cached_transcription),
+                })
+                print("Deferred meeting minutes to the batch API")
+                return None
+            else:
+                results, token_usage = await self.meeting_minutes(call_details, note_callback, planned=planned)
+                # Incomplete notes are not cached, so the next upload of this recording tries them again
+                if not results.get("failed_note_types"):
+                    await self.result_cache.put(minutes_key, "meeting_minutes", {"result": results})
             print("end meeting minutes")
             print("*" * 20)
 
-            print("Assigning title and note_type_responses")
-            # Assign the title and note type responses to CallDetailsModel
-            call_details.title = results['title']
-            call_details.note_type_responses = results['note_type_responses']
-            print("end title and note_type_responses")
-            print("*" * 20)
-
-            print("Start Token usage")
-            # Step 3: Accumulate token usage
-            token_usage_model = await self.accumulate_token_usage(token_usage, call_details.minutes_elapsed)
-            print("End Token usage")
-            print("*" * 20)
-
-            print("Save")
-            # Save the token usage and associate it with call details
-            call_details.token_usage = token_usage_model.save()
-            print("*" * 20)
-            print("Save")
-
-            # Step 4: Save the CallDetailsModel to MongoDB
-            call_details_document = call_details.save()
-            print("*" * 20)
-
-            # Step 5: Return the saved document as a dictionary to be sent back to the client
-            return call_details_document.to_dict()
+            return await self.store_results(call_details, results, token_usage, bool(cached_transcription),
+                                            stage_callback, call_id=call_id)
 
+        except HTTPException:
+            raise
         except Exception as e:
             print(f"Error during transcription processing: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Failed to process audio file: {str(e)}")
 
-    async def transcribe_with_assemblyai(self, file_location: str):
+    async def finish_deferred(self, call_details: CallDetailsModel, request: dict, response=None,
+                              stage_callback=None, call_id=None):
+        """
+        Store a call whose notes were deferred to the batch API. response is the batch's
+        (raw_response, token_usage) for request, or None if the batch did not answer it, in which
+        case the request is sent now at the normal rate. call_id is as for transcribe_audio.
+        """
+        if response is None:
+            raw_response, batched_token_usage = await self.complete(request["system_message"],
+                                                                    request["user_message"],
+                                                                    model=request.get("model", Config.NOTE_MODEL))
+            token_usage = dict(request["token_usage"])
+            self.add_token_usage(token_usage, batched_token_usage)
+            batched_token_usage = None
+        else:
+            raw_response, batched_token_usage = response
+            token_usage = request["token_usage"]
+
+        try:
+            results = self.parse_minutes(raw_response)
+        except json.JSONDecodeError as e:
+            print(f"Failed to parse JSON response: {e}")
+            raise HTTPException(status_code=500, detail="Failed to parse GPT response")
+        await self.result_cache.put(request["minutes_key"], "meeting_minutes", {"result": results})
+        return await self.store_results(call_details, results, token_usage, request["transcription_cached"],
+                                        stage_callback, batched_token_usage, call_id)
+
+    async def store_results(self, call_details: CallDetailsModel, results: dict, token_usage: dict,
+                            transcription_cached: bool, stage_callback=None, batched_token_usage=None,
+                            call_id=None):
+        # Price the call, store it with its notes and return it as sent to the client
+        print("Assigning title and note_type_responses")
+        # Assign the title and note type responses to CallDetailsModel
+        call_details.title = results['title']
+        call_details.note_type_responses = results['note_type_responses']
+        # Kept with the call so the client can offer to retry them through add_note_types
+        call_details.failed_note_types = results.get('failed_note_types') or None
+        print("end title and note_type_responses")
+        print("*" * 20)
+
+        print("Start Token usage")
+        # Step 3: Accumulate token usage
+        token_usage_model = await self.accumulate_token_usage(token_usage, call_details.minutes_elapsed,
+                                                              transcription_cached=transcription_cached,
+                                                              batched_token_usage=batched_token_usage)
+        print("End Token usage")
+        print("*" * 20)
+
+        print("Save")
+        await self.report_stage(stage_callback, "saving")
+        # Step 4: Save the call, notes and cost in one document, and the transcript beside it
+        call_details.token_usage = token_usage_model
+        call_details_document, transcript = await self.call_service.store_call(call_details, call_id)
+        print("*" * 20)
+
+        # Step 5: Return the saved document as a dictionary to be sent back to the client
+        return call_details_document.to_dict(transcript=transcript)
+
+    @staticmethod
+    async def report_stage(stage_callback, stage: str):
+        # Let the caller (e.g. a job worker) know which step of the pipeline is running
+        if stage_callback:
+            await stage_callback(stage)
+
+    @staticmethod
+    async def report_notes(note_callback, results: dict):
+        # Deliver already generated notes the same way streamed ones are delivered
+        if note_callback:
+            await note_callback({"title": results["title"]})
+            for note_type, response in results["note_type_responses"].items():
+                await note_callback({"note_type": note_type, "response": response})
+
+    async def transcribe_with_assemblyai(self, file_location: str, submitted_callback=None):
         try:
             print(f"Starting AssemblyAI transcription for file: {file_location}")
-            # Transcribe the local file using AssemblyAI
-            with open(file_location, "rb") as audio_file:
-                # Upload file to AssemblyAI
-                transcript = self.transcriber.transcribe(
-                    audio_file,
-                    config=self.aai_config
-                )
-                # Process the transcription result into your model format
-                transcription_model = TranscriptionResponseModel(
-                    utterances=[{
-                        "speaker": utterance.speaker,
-                        "start": utterance.start,
-                        "end": utterance.end,
-                        "text": utterance.text,
-                        "confidence": utterance.confidence
-                    } for utterance in transcript.utterances]
-                )
+            # Upload and transcribe the local file using AssemblyAI without blocking the event loop
+            transcript = await self.run_transcriber(file_location, submitted_callback)
+
+            # Process the transcription result into your model format
+            transcription_model = TranscriptionResponseModel(
+                utterances=[{
+                    "speaker": utterance.speaker,
+                    "start": utterance.start,
+                    "end": utterance.end,
+                    "text": utterance.text,
+                    "confidence": utterance.confidence
+                } for utterance in transcript.utterances]
+            )
 
-                print("Transcription completed with AssemblyAI")
-                pprint(transcription_model)
-                return transcription_model
+            print("Transcription completed with AssemblyAI")
+            pprint(transcription_model)
+            return transcription_model
 
         except Exception as e:
             print(f"AssemblyAI transcription failed: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Transcription failed: {str(e)}")
 
-    async def meeting_minutes(self, call_details: CallDetailsModel):
+    async def run_transcriber(self, file_location: str, submitted_callback=None):
+        # Upload and submit, then wait for the transcript as a second step so callers can
+        # tell the two apart; submitted_callback, if given, is awaited in between
+        loop = asyncio.get_running_loop()
+        transcript = await loop.run_in_executor(assemblyai_executor, self.submit_file, file_location)
+        if submitted_callback:
+            await submitted_callback()
+        # Poll from the event loop: only each status request uses a pool thread, so a transcription
+        # in progress never holds one while AssemblyAI works on it
+        while not await loop.run_in_executor(assemblyai_executor, self.refresh_transcript, transcript):
+            await asyncio.sleep(Config.ASSEMBLYAI_POLL_INTERVAL)
+        # A failed transcript has no utterances; never let it pass as an empty (and cached) one
+        if transcript.status == aai.TranscriptStatus.error:
+            raise RuntimeError(f"AssemblyAI could not transcribe {file_location}: {transcript.error}")
+        return transcript
+
+    def submit_file(self, file_location: str):
+        # Blocking AssemblyAI upload and submit; only ever run through run_transcriber
+        with open(file_location, "rb") as audio_file:
+            return self.transcriber.submit(audio_file, config=self.aai_config)
+
+    @staticmethod
+    def refresh_transcript(transcript):
+        # One blocking status request; True once the transcript is completed or failed. With a zero
+        # poll timeout the SDK fetches once, then raises a TranscriptError without a status code
+        # if the transcript is still queued or processing
+        try:
+            transcript.wait_for_completion(poll_timeout=0)
+        except aai.TranscriptError as e:
+            if e.status_code is not None:
+                raise
+            return False
+        return True
+
+    async def add_note_types(self, owner: str, call_id: str, note_types: list, regenerate: bool = False):
+        """
+        Generate note types for a stored call from its stored transcript, without transcribing
+        the audio again. Only note types the call does not have yet are generated, unless
+        regenerate is set; the responses are merged into the call and their cost added to it.
+        """
+        note_types = list(dict.fromkeys(note_types))
+        if not note_types:
+            raise HTTPException(status_code=400, detail="No note types requested")
+        if any("." in note_type or note_type.startswith("$") for note_type in note_types):
+            raise HTTPException(status_code=400, detail="Note types cannot contain '.' or start with '$'")
+
+        call = await self.call_service.find_call(owner, call_id)
+        existing = call.note_type_responses or {}
+        missing = note_types if regenerate else [note_type for note_type in note_types if note_type not in existing]
+        if not missing:
+            return await self.call_service.get_call(owner, call_id)
+
+        utterances = await self.call_service.load_utterances(call)
+        if not utterances:
+            raise HTTPException(status_code=400, detail="This call has no transcript")
+
+        # Stored calls may lack fields the upload model requires (e.g. a null role or callType)
+        try:
+            call_details = CallDetailsModel(
+                owner=call.owner,
+                date=call.date,
+                callType=call.callType or "",
+                notes=call.notes or "",
+                participants=[dict(participant.to_mongo().to_dict(), role=participant.role or "")
+                              for participant in call.participants],
+                notetype=missing,
+                minutes_elapsed=call.minutes_elapsed or 0,
+                transcription=TranscriptionResponseModel(utterances=utterances)
+            )
+        except ValidationError as e:
+            raise HTTPException(status_code=400, detail=f"This call's stored details are incomplete: {str(e)}")
+        results, token_usage = await self.meeting_minutes(call_details, include_title=False)
+        responses = {note_type: response for note_type, response in results["note_type_responses"].items()
+                     if note_type in missing and response}
+        if not responses:
+            raise HTTPException(status_code=500, detail="Failed to generate any of the requested notes")
+
+        # Nothing is transcribed, so only the tokens are billed
+        cost = await self.accumulate_token_usage(token_usage, 0, transcription_cached=True)
+        await self.call_service.add_notes(call, responses, cost)
+        return await self.call_service.get_call(owner, call_id)
+
+    async def meeting_minutes(self, call_details: CallDetailsModel, note_callback=None, include_title=True,
+                              planned: tuple = None):
+        """
+        Generate the title and note type responses. With note_callback, the callback is awaited
+        with {"title": ...} and each {"note_type": ..., "response": ...} as soon as that value is
+        complete. NOTE_GENERATION_MODE "per_type" generates every note type in its own request
+        (see generate_per_note_type); "combined" asks for all of them in one JSON response.
+        Without include_title, per_type mode skips the title request. planned is a result of
+        plan_meeting_minutes for this mode, if the caller already has one.
+        """
+        per_type = Config.NOTE_GENERATION_MODE == "per_type"
         print("inside Meeting minutes")
         print("-" * 20)
+
+        try:
+            # Step 1: Choose the model and price the request, condensing long transcripts first
+            system_message, transcript_content, combined_token_usage = await self.prepare_meeting_minutes(
+                call_details, per_type, planned
+            )
+            model = combined_token_usage["model"]
+
+            # Step 2: Generate the title and note type responses from the transcript or condensed notes
+            if per_type:
+                result, token_usage = await self.generate_per_note_type(call_details, transcript_content,
+                                                                        note_callback, include_title, model)
+                note_type_usage = token_usage.pop("note_types")
+                self.add_token_usage(combined_token_usage, token_usage)
+                combined_token_usage["note_types"] = note_type_usage
+                return result, combined_token_usage
+
+            if note_callback and Config.STREAM_NOTE_GENERATION:
+                raw_response, token_usage = await self.complete_stream(system_message, transcript_content,
+                                                                       note_callback, model)
+            else:
+                raw_response, token_usage = await self.complete(system_message, transcript_content, model=model)
+            self.add_token_usage(combined_token_usage, token_usage)
+            print(f"Raw GPT response: {raw_response}")
+            print("*" * 20)
+
+            return self.parse_minutes(raw_response), combined_token_usage
+
+        except json.JSONDecodeError as e:
+            print(f"Failed to parse JSON response: {e}")
+            raise HTTPException(status_code=500, detail="Failed to parse GPT response")
+        except HTTPException:
+            raise
+        except Exception as e:
+            print(f"General error: {e}")
+            raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+    async def prepare_meeting_minutes(self, call_details: CallDetailsModel, per_type: bool = False,
+                                      planned: tuple = None):
+        """
+        Price the request before sending anything, planning it first unless planned is given. Long
+        transcripts are condensed window by window first (map), so the final request (reduce) always
+        fits in the model's context. Returns the system message, the transcript content for the final
+        request and the token usage spent so far, whose "model" is the model chosen for the call.
+        """
+        if planned is None:
+            planned = await run_in_threadpool(self.plan_meeting_minutes, call_details, per_type)
+        system_message, transcript_lines, plan = planned
+        print(f"Prompt plan: {plan['mode']} on {plan['model']}, {plan['prompt_tokens']} prompt tokens, "
+              f"estimated cost ${plan['estimated_cost']:.4f}")
+        if Config.MAX_NOTE_GENERATION_COST is not None and plan["estimated_cost"] > Config.MAX_NOTE_GENERATION_COST:
+            raise HTTPException(
+                status_code=402,
+                detail=f"Estimated note generation cost ${plan['estimated_cost']:.4f} exceeds the limit"
+            )
+        print("-" * 20)
+
+        if plan["mode"] == "single":
+            return system_message, "\n".join(transcript_lines), \
+                {"total_tokens": 0, "prompt_tokens": 0, "completion_tokens": 0, "model": plan["model"]}
+        transcript_content, token_usage = await self.condense_transcript(call_details, system_message,
+                                                                         transcript_lines, plan["model"])
+        return system_message, transcript_content, dict(token_usage, model=plan["model"])
+
+    @staticmethod
+    def parse_minutes(raw_response: str):
+        # Clean up the response by removing code block markers, then parse the JSON
+        if raw_response.startswith("```json"):
+            raw_response = raw_response[7:]
+        if raw_response.endswith("```"):
+            raw_response = raw_response[:-3]
+        return json.loads(raw_response)
+
+    def final_system_message(self, call_details: CallDetailsModel, per_type: bool):
+        # The system message the notes are generated with, per note type or combined
+        if per_type:
+            return self.build_shared_system_message(call_details)
+        return self.build_system_message(call_details)
+
+    def estimate_meeting_minutes(self, call_details: CallDetailsModel):
+        # Token counts, processing mode and estimated cost for meeting_minutes, without calling OpenAI
+        return self.plan_meeting_minutes(call_details)[2]
+
+    def plan_meeting_minutes(self, call_details: CallDetailsModel, per_type: bool = False):
+        # The system message, compact transcript lines (one per speaker turn) and token plan; CPU-bound
+        system_message = self.build_system_message(call_details)
+        transcript_lines = self.token_budget.compact_utterances(call_details.transcription.utterances)
+        plan = self.token_budget.plan(system_message, transcript_lines, len(call_details.notetype), fan_out=per_type)
+        return system_message, transcript_lines, plan
+
+    async def generate_per_note_type(self, call_details: CallDetailsModel, transcript_content: str,
+                                     note_callback=None, include_title=True, model: str = Config.NOTE_MODEL):
+        """
+        Generate the title and each note type in concurrent, independently retried requests.
+        Every request starts with the same system message and transcript, so OpenAI can serve
+        that shared prefix from its prompt cache, and only a short instruction differs. A note
+        type that still fails after NOTE_TYPE_MAX_ATTEMPTS is left out instead of failing the
+        call. Returns the result and token usage with a per note type breakdown in "note_types".
+        """
+        system_message = self.build_shared_system_message(call_details)
+
+        async def generate_title():
+            title, usage = await self.complete_with_retries(
+                system_message, transcript_content, model,
+                "Write a short title summarizing the main focus of this call. Respond only with the title, "
+                "without quotes or Markdown."
+            )
+            if note_callback:
+                await note_callback({"title": title})
+            return title, usage
+
+        async def generate_note(note_type: str):
+            description = NOTE_TYPE_DESCRIPTORS.get(note_type, f"Provide details for '{note_type}'.")
+            response, usage = await self.complete_with_retries(
+                system_message, transcript_content, model,
+                f"Write the \"{note_type}\" notes for this call: {description}. Respond only with the notes, "
+                f"formatted in Markdown, without any preamble."
+            )
+            if note_callback:
+                await note_callback({"note_type": note_type, "response": response})
+            return response, usage
+
+        async def no_title():
+            return None, {}
+
+        outcomes = await asyncio.gather(
+            generate_title() if include_title else no_title(),
+            *[generate_note(note_type) for note_type in call_details.notetype],
+            return_exceptions=True
+        )
+        title_outcome, note_outcomes = outcomes[0], outcomes[1:]
+
+        token_usage = {"total_tokens": 0, "prompt_tokens": 0, "completion_tokens": 0, "note_types": {}}
+        note_type_responses = {}
+        failed = []
+        for note_type, outcome in zip(call_details.notetype, note_outcomes):
+            if isinstance(outcome, Exception):
+                print(f"Note type {note_type} failed: {str(outcome)}")
+                failed.append(note_type)
+                continue
+            note_type_responses[note_type], usage = outcome
+            token_usage["note_types"][note_type] = usage
+            self.add_token_usage(token_usage, usage)
+
+        if call_details.notetype and not note_type_responses:
+            raise HTTPException(status_code=500, detail="Failed to generate any of the requested notes")
+
+        if isinstance(title_outcome, Exception):
+            print(f"Title generation failed: {str(title_outcome)}")
+            title = f"{call_details.callType} on {call_details.date:%Y-%m-%d}"
+        else:
+            title, usage = title_outcome
+            self.add_token_usage(token_usage, usage)
+
+        result = {"title": title, "note_type_responses": note_type_responses}
+        if failed:
+            result["failed_note_types"] = failed
+        return result, token_usage
+
+    async def complete_with_retries(self, system_message: str, user_message: str, model: str, instruction: str):
+        # Retry transient API errors and empty responses with exponential backoff
+        for attempt in range(Config.NOTE_TYPE_MAX_ATTEMPTS):
+            try:
+                text, usage = await self.complete(system_message, user_message, instruction, model)
+                if text:
+                    return text, usage
+                error = "Empty response"
+            except Exception as e:
+                error = str(e)
+            if attempt + 1 < Config.NOTE_TYPE_MAX_ATTEMPTS:
+                print(f"Completion attempt {attempt + 1} failed ({error}), retrying")
+                await asyncio.sleep(Config.NOTE_TYPE_RETRY_DELAY * 2 ** attempt)
+        raise RuntimeError(f"Completion failed after {Config.NOTE_TYPE_MAX_ATTEMPTS} attempts: {error}")
+
+    def build_shared_system_message(self, call_details: CallDetailsModel):
+        # Call context only, with no note type specifics, so it is identical for every per type request
+        host_role = [participant.role for participant in call_details.participants if participant.isHost]
+        participant_names = [participant.name for participant in call_details.participants]
+        notes = call_details.notes if call_details.notes else "No additional notes provided."
+        return f"""
+        You are a highly skilled AI specializing in conversation analysis and trained to assist {', '.join(host_role)} based on their specific responsibilities and tasks.
+        The user message is the transcription of a {call_details.callType}, followed by one request about it.
+        Each transcription line starts with the label of the speaker followed by a colon.
+        The call includes {len(call_details.participants)} participants: {', '.join(participant_names)}.
+        Additional context provided in the notes: '{notes}'.
+        """
+
+    def build_system_message(self, call_details: CallDetailsModel):
         # Extract roles of participants who are hosts
         host_role = [participant.role for participant in call_details.participants if participant.isHost]
         roles = ', '.join(host_role)
-        print("set host role and roles")
         # Extract participant names and count
         participant_names = [participant.name for participant in call_details.participants]
         participant_count = len(call_details.participants)
-        print("set participant names and count")
         # Use callType since customCallType no longer exists
         call_type = call_details.callType
         notes = call_details.notes if call_details.notes else "No additional notes provided."
-        print('set call type and notes')
-
-        # Prepare a breakdown of each utterance with speaker and text
-        utterance_breakdown = "\n".join(
-            [f"Speaker {utterance.speaker}: {utterance.text}" for utterance in call_details.transcription.utterances]
-        )
 
         # Prepare the note type requests based on the provided list
         note_type_requests = []
@@ -156,16 +550,14 @@ class TranscriptionService:
             note_type_requests.append(
                 f"\"{note_type}\": \"{description}. (Use Markdown Formatting in this response).\""
             )
-        print("set note type requests")
-        print("-" * 20)
 
         # Join the custom instructions for each requested note type
         note_type_instructions = ",\n".join(note_type_requests)
-        print("note type instructions")
-        # Construct the system message with updated call type reference, utterance breakdown, and dynamic note type requests
-        system_message = f"""
+        # Construct the system message with updated call type reference and dynamic note type requests
+        return f"""
         You are a highly skilled AI specializing in conversation analysis and trained to assist {roles} based on their specific responsibilities and tasks.
         Based on the following transcription from a {call_type}, please generate the requested information for each of the specified note types.
+        Each transcription line starts with the label of the speaker followed by a colon.
         The call includes {participant_count} participants: {', '.join(participant_names)}.
         Additional context provided in the notes: '{notes}'.
 
@@ -182,105 +574,216 @@ class TranscriptionService:
         }}
         ```
         """
-        print("generated system message")
 
-        print("-" * 20)
+    async def condense_transcript(self, call_details: CallDetailsModel, system_message: str, blocks: list,
+                                  model: str = Config.NOTE_MODEL):
+        """
+        Map step of map-reduce summarisation: while the transcript is larger than one window,
+        split it into token-budgeted windows and summarise them concurrently. Returns the text
+        to send to the final request and the token usage spent getting there.
+        """
+        token_usage = {"total_tokens": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        window_tokens = Config.MEETING_MINUTES_WINDOW_TOKENS - self.token_budget.count(system_message)
+        content = "\n".join(blocks)
+        while self.token_budget.count(content) > window_tokens:
+            windows = self.token_budget.split_windows(blocks, window_tokens)
+            print(f"Transcript too long for one request, summarising {len(windows)} windows")
+
+            summaries = await asyncio.gather(*[
+                self.summarize_window(call_details, window, index + 1, len(windows), model)
+                for index, window in enumerate(windows)
+            ])
+            for _, usage in summaries:
+                self.add_token_usage(token_usage, usage)
+
+            blocks = [f"## Part {index + 1} of {len(windows)}\n{summary}" for index, (summary, _) in enumerate(summaries)]
+            content = (
+                "The transcription was too long to include in full. These are condensed notes from each "
+                "consecutive part of it, in order:\n\n" + "\n\n".join(blocks)
+            )
+            # A single window cannot be condensed any further
+            if len(windows) == 1:
+                break
+        return content, token_usage
+
+    async def summarize_window(self, call_details: CallDetailsModel, window: str, part: int, total_parts: int,
+                               model: str = Config.NOTE_MODEL):
+        note_types = "\n".join(
+            f"- {note_type}: {NOTE_TYPE_DESCRIPTORS.get(note_type, f'Provide details for {note_type!r}.')}"
+            for note_type in call_details.notetype
+        )
+        system_message = f"""
+        You are condensing part {part} of {total_parts} of a transcription from a {call_details.callType}.
+        Extract everything in this part that is relevant to the following note types, keeping speaker attributions,
+        decisions, action items, names, numbers and dates:
+        {note_types}
 
-        try:
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
+        Respond in Markdown with one section per note type, and omit a section if this part has nothing for it.
+        """
+        return await self.complete(system_message, window, model=model)
+
+    async def complete(self, system_message: str, user_message: str, instruction: str = None,
+                       model: str = Config.NOTE_MODEL):
+        # One chat completion; returns the stripped response text and its token usage. An
+        # instruction is sent as a final message, after the (cacheable) system and user messages.
+        messages = [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": user_message}
+        ]
+        if instruction:
+            messages.append({"role": "user", "content": instruction})
+        async with openai_semaphore:
+            response = await client.chat.completions.create(
+                model=model,
+                temperature=0,
+                messages=messages
+            )
+
+        return (response.choices[0].message.content or "").strip(), self.usage_dict(response.usage)
+
+    @staticmethod
+    def usage_dict(usage):
+        # Token counts from an OpenAI usage object; cached_tokens are prompt tokens served from the prompt cache
+        details = getattr(usage, "prompt_tokens_details", None)
+        return {
+            "total_tokens": usage.total_tokens,
+            "prompt_tokens": usage.prompt_tokens,
+            "completion_tokens": usage.completion_tokens,
+            "cached_tokens": getattr(details, "cached_tokens", None) or 0
+        }
+
+    async def complete_stream(self, system_message: str, user_message: str, note_callback,
+                              model: str = Config.NOTE_MODEL):
+        """
+        Streamed version of complete for the meeting minutes response: the JSON is parsed as it
+        arrives and note_callback is awaited for the title and each note type response.
+        """
+        parser = IncrementalJsonParser()
+        parts = []
+        token_usage = {"total_tokens": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        async with openai_semaphore:
+            stream = await client.chat.completions.create(
+                model=model,
                 temperature=0,
                 messages=[
                     {"role": "system", "content": system_message},
-                    {"role": "user", "content": utterance_breakdown}  # Use the transcription text from the model
-                ]
+                    {"role": "user", "content": user_message}
+                ],
+                stream=True,
+                stream_options={"include_usage": True}
             )
-
-            raw_response = response.choices[0].message.content.strip()
-            print(f"Raw GPT response: {raw_response}")
-            print("*" * 20)
-
-            # Clean up the response by removing code block markers
-            if raw_response.startswith("```json"):
-                raw_response = raw_response[7:]
-            if raw_response.endswith("```"):
-                raw_response = raw_response[:-3]
-
-            # Parse the response into JSON
-            result = json.loads(raw_response)
-
-            # Collect token usage data from the API response
-            combined_token_usage = {
-                "total_tokens": response.usage.total_tokens,
-                "prompt_tokens": response.usage.prompt_tokens,
-                "completion_tokens": response.usage.completion_tokens
-            }
-
-            return result, combined_token_usage
-
-        except json.JSONDecodeError as e:
-            print(f"Failed to parse JSON response: {e}")
-            raise HTTPException(status_code=500, detail="Failed to parse GPT response")
-        except Exception as e:
-            print(f"General error: {e}")
-            raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
-
-    async def accumulate_token_usage(self, combined_token_usage, minutes_elapsed):
-        input_token_rate = 0.150 / 1_000_000
-        output_token_rate = 0.600 / 1_000_000
-        transcription_cost = minutes_elapsed * (0.37 / 60)
-
-        prompt_tokens = combined_token_usage.get('prompt_tokens', 0)
-        completion_tokens = combined_token_usage.get('completion_tokens', 0)
-
-        input_cost = prompt_tokens * input_token_rate
-        output_cost = completion_tokens * output_token_rate
+            async for chunk in stream:
+                # Usage arrives on a final chunk with no choices
+                if chunk.usage:
+                    token_usage = self.usage_dict(chunk.usage)
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+
+                delta = chunk.choices[0].delta.content
+                parts.append(delta)
+                for path, value in parser.feed(delta):
+                    if path == ("title",):
+                        await note_callback({"title": value})
+                    elif len(path) == 2 and path[0] == "note_type_responses":
+                        await note_callback({"note_type": path[1], "response": value})
+
+        return "".join(parts).strip(), token_usage
+
+    @staticmethod
+    def add_token_usage(total: dict, usage: dict):
+        for key, value in usage.items():
+            total[key] = total.get(key, 0) + value
+
+    async def accumulate_token_usage(self, combined_token_usage, minutes_elapsed, transcription_cached=False,
+                                     batched_token_usage=None):
+        # A transcription served from the result cache was not billed by AssemblyAI again
+        transcription_cost = 0.0 if transcription_cached else minutes_elapsed * Config.TRANSCRIPTION_RATE_PER_HOUR / 60
+
+        # Every request for a call goes to the model chosen for it; none is recorded when nothing was sent
+        model = combined_token_usage.get('model')
+        input_cost, output_cost = self.token_cost(combined_token_usage, model)
+        if batched_token_usage:
+            # Requests answered through the batch API are billed at a discount
+            batched_input_cost, batched_output_cost = self.token_cost(batched_token_usage, model)
+            input_cost += batched_input_cost * Config.BATCH_RATE_MULTIPLIER
+            output_cost += batched_output_cost * Config.BATCH_RATE_MULTIPLIER
         total_cost = transcription_cost + input_cost + output_cost
 
+        # Per note type breakdown when note types were generated in separate requests
+        note_types = {
+            note_type: dict(usage, cost=sum(self.token_cost(usage, model)))
+            for note_type, usage in combined_token_usage.get('note_types', {}).items()
+        }
+
         token_usage_model = TokenUsageModel(
+            model=model,
             transcription_cost=transcription_cost,
             input_cost=input_cost,
             output_cost=output_cost,
-            total_cost=total_cost
+            total_cost=total_cost,
+            note_types=note_types or None
         )
 
         return token_usage_model
 
-    async def transcribe_large_file(self, file_location: str):
-        try:
-            # Split the audio file into smaller chunks
-            chunk_files = self.split_audio(file_location)
-            transcription_results = []
+    @staticmethod
+    def token_cost(token_usage: dict, model: str = None):
+        # Input and output cost in USD; prompt tokens served from OpenAI's prompt cache are billed at a discount
+        rates = model_rates(model or Config.NOTE_MODEL)
+        cached_tokens = token_usage.get('cached_tokens', 0)
+        input_cost = ((token_usage.get('prompt_tokens', 0) - cached_tokens) * rates["input"]
+                      + cached_tokens * rates["cached_input"])
+        return input_cost, token_usage.get('completion_tokens', 0) * rates["output"]
 
-            for chunk_file in chunk_files:
-                with open(chunk_file, "rb") as audio_file:
-                    # Upload file to AssemblyAI and transcribe
-                    transcript = self.transcriber.transcribe(audio_file, config=self.aai_config)
+    async def transcribe_large_file(self, file_location: str, duration_seconds: float, progress_callback=None):
+        """
+        progress_callback, if given, is awaited with (phase, segments_done, segments_total) as
+        segments are cut ("splitting") and then transcribed ("transcribing").
+        """
+        async def report_progress(phase: str, done: int, total: int):
+            if progress_callback:
+                await progress_callback(phase, done, total)
 
-                    # Collect each chunk's transcription results
-                    transcription_results.extend([{
+        try:
+            # Split the audio file into overlapping segments by duration, in a directory private to this call
+            plan = LongAudioService.plan_segments(duration_seconds)
+            async with self.audio_splitter.split(
+                    file_location, plan, lambda done, total: report_progress("splitting", done, total)
+            ) as segments:
+                print(f"Split {file_location} into {len(segments)} segments")
+
+                # Transcribe segments concurrently, at most LONG_AUDIO_PARALLELISM at a time per file
+                semaphore = asyncio.Semaphore(Config.LONG_AUDIO_PARALLELISM)
+                transcribed_count = 0
+
+                async def transcribe_segment(segment):
+                    nonlocal transcribed_count
+                    async with semaphore:
+                        transcript = await self.run_transcriber(segment.path)
+                    # Word timestamps let merge_segments cut turns that run across an overlap
+                    utterances = [{
                         "speaker": utterance.speaker,
                         "start": utterance.start,
                         "end": utterance.end,
                         "text": utterance.text,
-                        "confidence": utterance.confidence
-                    } for utterance in transcript.utterances])
-
-            # Combine the transcriptions into a single model
-            transcription_model = TranscriptionResponseModel(utterances=transcription_results)
-            print("Transcription completed for all chunks")
-            pprint(transcription_model)
+                        "confidence": utterance.confidence,
+                        "words": [{"text": word.text, "start": word.start, "end": word.end,
+                                   "confidence": word.confidence} for word in utterance.words or []]
+                    } for utterance in transcript.utterances or []]
+                    transcribed_count += 1
+                    await report_progress("transcribing", transcribed_count, len(segments))
+
+                    # Segment timestamps restart at zero; shift them onto the full recording
+                    offset_ms = int(segment.start * 1000)
+                    return offset_ms, int(segment.length * 1000), LongAudioService.rebase(utterances, offset_ms)
+
+                transcribed = await asyncio.gather(*[transcribe_segment(segment) for segment in segments])
+
+            # Drop utterances duplicated in overlaps and give speakers consistent labels across segments
+            transcription_model = TranscriptionResponseModel(utterances=LongAudioService.merge_segments(transcribed))
+            print("Transcription completed for all segments")
             return transcription_model
 
         except Exception as e:
             print(f"Transcription failed: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Transcription failed: {str(e)}")
-
-    def split_audio(self, file_location: str):
-        # Use FFmpeg to split the audio file
-        output_pattern = os.path.join(os.path.dirname(file_location), "output_chunk_%03d.mp3")
-        split_command = f"ffmpeg -i {file_location} -f segment -segment_time 1800 -segment_overlap 5 -c copy {output_pattern}"
-        os.system(split_command)
-
-        # Get the list of chunked audio files
-        return glob.glob(os.path.join(os.path.dirname(file_location), "output_chunk_*.mp3"))
\ No newline at end of file
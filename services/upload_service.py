@@ -0,0 +1,246 @@
+import asyncio
+import hashlib
+import os
+import re
+import shutil
+import time
+import uuid
+
+from fastapi import UploadFile, HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from services.session_store import create_session_store
+from settings import Config
+
+
+class UploadService:
+    # Session ids name directories and files under upload_dir, so only plain names are accepted
+    SESSION_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+    def __init__(self, upload_dir: str = Config.UPLOAD_DIR, block_size: int = Config.UPLOAD_BLOCK_SIZE,
+                 session_store=None):
+        self.upload_dir = upload_dir
+        self.block_size = block_size
+        self.sessions = session_store or create_session_store()
+        self._sweeper = None
+
+    async def receive_chunk(self, session_id: str, chunk_index: int, total_chunks: int, file: UploadFile,
+                            call_details: dict = None, checksum: str = None, owner: str = None):
+        """
+        Store one chunk and record it on the session. Returns the session, whether the chunk
+        had already been received, and whether this request should assemble the file.
+        A session belongs to the user who created it; anyone else gets a 404.
+        """
+        self.check_session_id(session_id)
+        if not 0 <= chunk_index < total_chunks:
+            raise HTTPException(status_code=400, detail="chunk_index must be between 0 and total_chunks - 1")
+
+        # Re-uploads of a chunk that already arrived are acknowledged without being written again
+        session = await self.sessions.get(session_id)
+        self.check_owner(session, owner)
+        self.check_total_chunks(session, total_chunks)
+        duplicate = bool(session) and chunk_index in session["received_chunks"]
+        if not duplicate:
+            await self.save_chunk(session_id, chunk_index, file, checksum)
+
+        session = await self.sessions.add_chunk(session_id, chunk_index, total_chunks, call_details, owner)
+        # Another request may have created the session between the checks above and this chunk
+        self.check_owner(session, owner)
+        self.check_total_chunks(session, total_chunks)
+        print(f"Received chunk {chunk_index + 1}/{total_chunks} for session {session_id}"
+              f"{' (duplicate)' if duplicate else ''}")
+
+        complete = session["received_chunks"].is_complete()
+        if complete and not session["call_details"]:
+            raise HTTPException(status_code=400, detail="Call details were never sent for this session")
+        return session, duplicate, complete and await self.sessions.claim_assembly(session_id)
+
+    async def get_status(self, session_id: str, owner: str = None):
+        self.check_session_id(session_id)
+        session = await self.sessions.get(session_id)
+        if not session or (owner is not None and session.get("owner") != owner):
+            return None
+
+        received = session["received_chunks"]
+        return {
+            "session_id": session_id,
+            "total_chunks": session["total_chunks"],
+            "received_count": len(received),
+            "missing_chunks": received.missing(),
+            "has_call_details": bool(session["call_details"]),
+            "complete": received.is_complete(),
+        }
+
+    async def release(self, session_id: str):
+        # Called when assembling or queueing a claimed session fails; the client can retry its last chunk
+        await self.sessions.release_assembly(session_id)
+
+    async def finish(self, session_id: str):
+        # Clean up chunks and session data once the assembled file has been handed off
+        self.cleanup(session_id)
+        await self.sessions.delete(session_id)
+
+    def start_sweeper(self):
+        self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def stop_sweeper(self):
+        if self._sweeper:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+
+    async def expire_sessions(self):
+        # Drop abandoned sessions and their chunks, plus any chunk directories no store knows about
+        expired = await self.sessions.pop_expired(Config.SESSION_TTL_SECONDS)
+        for session_id in expired:
+            self.cleanup(session_id)
+
+        if os.path.isdir(self.upload_dir):
+            cutoff = time.time() - Config.SESSION_TTL_SECONDS
+            for entry in os.scandir(self.upload_dir):
+                if entry.is_dir() and self.SESSION_ID_PATTERN.fullmatch(entry.name) and entry.stat().st_mtime < cutoff \
+                        and not await self.sessions.get(entry.name):
+                    self.cleanup(entry.name)
+                    expired.append(entry.name)
+
+        if expired:
+            print(f"Expired {len(expired)} abandoned upload sessions")
+        return expired
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(Config.SESSION_SWEEP_INTERVAL)
+            try:
+                await self.expire_sessions()
+            except Exception as e:
+                print(f"Error expiring upload sessions: {str(e)}")
+
+    @classmethod
+    def check_session_id(cls, session_id: str):
+        if not isinstance(session_id, str) or not cls.SESSION_ID_PATTERN.fullmatch(session_id):
+            raise HTTPException(status_code=400,
+                                detail="session_id must be 1-64 letters, digits, '-' or '_'")
+
+    @staticmethod
+    def check_owner(session, owner: str = None):
+        # Sessions of other users are reported exactly like sessions that do not exist
+        if session and owner is not None and session.get("owner") != owner:
+            raise HTTPException(status_code=404, detail="Upload session not found")
+
+    @staticmethod
+    def check_total_chunks(session, total_chunks: int):
+        # Every chunk of a session must agree on its size, or its bitmap could never complete correctly
+        if session and session["total_chunks"] != total_chunks:
+            raise HTTPException(status_code=400,
+                                detail=f"total_chunks does not match this session's {session['total_chunks']}")
+
+    def session_path(self, session_id: str):
+        self.check_session_id(session_id)
+        return os.path.join(self.upload_dir, session_id)
+
+    def chunk_path(self, session_id: str, chunk_index: int):
+        return os.path.join(self.session_path(session_id), f"chunk_{chunk_index}")
+
+    def final_path(self, session_id: str):
+        self.check_session_id(session_id)
+        return os.path.join(self.upload_dir, f"{session_id}.m4a")
+
+    async def save_chunk(self, session_id: str, chunk_index: int, file: UploadFile, checksum: str = None):
+        # Ensure the session directory exists
+        os.makedirs(self.session_path(session_id), exist_ok=True)
+
+        # Stream the part to disk in fixed-size blocks so it is never held in memory whole
+        chunk_path = self.chunk_path(session_id, chunk_index)
+        written = await run_in_threadpool(self._stream_to_file, file.file, chunk_path, checksum)
+        if written is None:
+            # Reject a corrupted part so the client re-sends it instead of producing a broken recording
+            raise HTTPException(status_code=400, detail=f"Checksum mismatch for chunk {chunk_index}")
+        return written
+
+    async def assemble(self, session_id: str, total_chunks: int):
+        final_path = self.final_path(session_id)
+        await run_in_threadpool(self._assemble, session_id, total_chunks, final_path)
+        return final_path
+
+    def cleanup(self, session_id: str):
+        # Remove the session's chunks; the assembled file is kept for transcription
+        path = os.path.realpath(self.session_path(session_id))
+        upload_dir = os.path.realpath(self.upload_dir)
+        if os.path.commonpath([path, upload_dir]) != upload_dir or path == upload_dir:
+            raise ValueError(f"Refusing to remove {path}, which is outside {upload_dir}")
+        shutil.rmtree(path, ignore_errors=True)
+
+    def _stream_to_file(self, source, destination: str, checksum: str = None):
+        # Returns the bytes written, or None if the optional SHA-256 checksum did not match
+        written = 0
+        digest = hashlib.sha256() if checksum else None
+
+        # Write to a temporary name and rename, so a concurrent retry of the same chunk
+        # can never leave a half-written file behind
+        partial_path = f"{destination}.{uuid.uuid4().hex}.part"
+        with open(partial_path, "wb") as chunk_file:
+            while block := source.read(self.block_size):
+                chunk_file.write(block)
+                if digest:
+                    digest.update(block)
+                written += len(block)
+
+        if digest and digest.hexdigest() != checksum.lower():
+            os.remove(partial_path)
+            return None
+        os.replace(partial_path, destination)
+        return written
+
+    def _assemble(self, session_id: str, total_chunks: int, final_path: str):
+        chunk_paths = [self.chunk_path(session_id, i) for i in range(total_chunks)]
+        sizes = [os.path.getsize(path) for path in chunk_paths]
+
+        with open(final_path, "wb") as final_file:
+            # Preallocate the final file so every chunk can be written straight to its offset
+            final_fd = final_file.fileno()
+            total_size = sum(sizes)
+            if hasattr(os, "posix_fallocate") and total_size:
+                os.posix_fallocate(final_fd, 0, total_size)
+            else:
+                os.truncate(final_fd, total_size)
+
+            offset = 0
+            for path, size in zip(chunk_paths, sizes):
+                with open(path, "rb") as chunk:
+                    self._copy_range(chunk.fileno(), final_fd, size, offset)
+                offset += size
+
+    def _copy_range(self, source_fd: int, destination_fd: int, size: int, offset: int):
+        # Copy inside the kernel where possible (copy_file_range, then sendfile) so chunk
+        # data is never read back into user space; fall back to a block copy elsewhere
+        copied = 0
+        if hasattr(os, "copy_file_range"):
+            try:
+                while copied < size:
+                    count = os.copy_file_range(source_fd, destination_fd, size - copied, copied, offset + copied)
+                    if count == 0:
+                        break
+                    copied += count
+                return
+            except OSError:
+                pass
+
+        os.lseek(destination_fd, offset + copied, os.SEEK_SET)
+        if hasattr(os, "sendfile"):
+            try:
+                while copied < size:
+                    count = os.sendfile(destination_fd, source_fd, copied, size - copied)
+                    if count == 0:
+                        break
+                    copied += count
+                return
+            except OSError:
+                os.lseek(destination_fd, offset + copied, os.SEEK_SET)
+
+        os.lseek(source_fd, copied, os.SEEK_SET)
+        while copied < size:
+            block = os.read(source_fd, min(self.block_size, size - copied))
+            if not block:
+                break
+            os.write(destination_fd, block)
+            copied += len(block)
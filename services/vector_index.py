@@ -0,0 +1,92 @@
+import asyncio
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+
+from database import SearchEntryRepository
+from services.embedding_service import EmbeddingService, np
+from settings import Config
+
+
+class VectorIndex:
+    """
+    In-process cosine top-k over every embedded SearchEntry of an owner, held as one NumPy
+    matrix per owner. The matrix is loaded on first use and then extended incrementally with
+    entries embedded since the last refresh (by embedded_at), including those written by other
+    processes; rows of entries deleted by a reindex are dropped the first time a search returns
+    them. Only the SEARCH_INDEX_CACHE_OWNERS most recently searched owners are kept in memory.
+    """
+
+    # Re-scan this far behind the newest loaded embedded_at, since other processes' clocks and
+    # in-flight writes may land slightly out of order
+    REFRESH_OVERLAP = timedelta(seconds=5)
+
+    def __init__(self, max_owners: int = Config.SEARCH_INDEX_CACHE_OWNERS):
+        self.entries = SearchEntryRepository()
+        self.max_owners = max_owners
+        self._owners = OrderedDict()
+        self._locks = {}
+
+    async def search(self, owner: str, vector, limit: int, call_id=None):
+        # [(entry id, cosine similarity)] best first, optionally within one call
+        state = await self.refresh(owner)
+        if state["matrix"] is None:
+            return []
+
+        scores = state["matrix"] @ vector
+        if call_id is not None:
+            scores = np.where(np.array(state["call_ids"]) == call_id, scores, -np.inf)
+        top = np.argsort(-scores)[:limit]
+        return [(state["ids"][row], float(scores[row])) for row in top if np.isfinite(scores[row])]
+
+    async def refresh(self, owner: str):
+        # Returns the owner's state; it may already be evicted from the cache by the time it is used
+        lock = self._locks.setdefault(owner, asyncio.Lock())
+        try:
+            async with lock:
+                state = self._owners.get(owner) or {"ids": [], "call_ids": [], "known": set(), "matrix": None,
+                                                    "embedded_at": None}
+                query = {"owner": owner, "embedding": {"$exists": True}}
+                if state["embedded_at"] is not None:
+                    query["embedded_at"] = {"$gte": state["embedded_at"] - self.REFRESH_OVERLAP}
+
+                rows = []
+                cursor = self.entries.collection.find(query, {"call_id": 1, "embedding": 1, "embedded_at": 1})
+                async for son in cursor:
+                    embedded_at = son.get("embedded_at")
+                    if embedded_at is not None:
+                        # PyMongo returns naive UTC datetimes
+                        embedded_at = embedded_at.replace(tzinfo=timezone.utc)
+                        state["embedded_at"] = max(state["embedded_at"] or embedded_at, embedded_at)
+                    if son["_id"] in state["known"]:
+                        continue
+                    state["known"].add(son["_id"])
+                    state["ids"].append(son["_id"])
+                    state["call_ids"].append(son["call_id"])
+                    rows.append(EmbeddingService.from_bytes(son["embedding"]))
+
+                if rows:
+                    new_rows = np.vstack(rows)
+                    state["matrix"] = new_rows if state["matrix"] is None else np.vstack([state["matrix"], new_rows])
+                if state["embedded_at"] is None:
+                    # Nothing carries embedded_at yet; later refreshes only need entries embedded from now on
+                    state["embedded_at"] = datetime.now(timezone.utc)
+
+                self._owners[owner] = state
+                self._owners.move_to_end(owner)
+                while len(self._owners) > self.max_owners:
+                    self._owners.popitem(last=False)
+                return state
+        finally:
+            self._locks.pop(owner, None)
+
+    def discard(self, owner: str, entry_ids):
+        # Drop rows whose entries no longer exist
+        state = self._owners.get(owner)
+        entry_ids = set(entry_ids)
+        if not state or not entry_ids:
+            return
+        keep = [row for row, entry_id in enumerate(state["ids"]) if entry_id not in entry_ids]
+        state["ids"] = [state["ids"][row] for row in keep]
+        state["call_ids"] = [state["call_ids"][row] for row in keep]
+        state["known"] -= entry_ids
+        state["matrix"] = state["matrix"][keep] if keep else None
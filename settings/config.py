@@ -1,3 +1,4 @@
+import json
 import os
 from dotenv import load_dotenv
 load_dotenv()
@@ -6,5 +7,106 @@ class Config:
     MONGO_USER = os.getenv("MONGO_USER", "admin")
     MONGO_PASS = os.getenv("MONGO_PASS", "password")
     MONGO_HOST = os.getenv("MONGO_HOST", "localhost")
+    # Connection pool of the async client used by request handlers
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+    MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+    MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 60000))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 10000))  # Wait for a free connection
     OPEN_API_KEY = os.getenv("OPENAI_API_KEY")
     ASSEMBLYAI_API_KEY = os.getenv("ASSEMBLYAI_API_KEY")
+
+    # Transcription job queue
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))  # Workers started inside each API process (0 = use worker.py only)
+    JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 2.0))  # Seconds between queue polls when idle
+    JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", 3600))  # Running jobs without a heartbeat this long are retried
+    JOB_REQUEUE_INTERVAL = float(os.getenv("JOB_REQUEUE_INTERVAL", 300.0))  # Seconds between stale job checks
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+    JOB_LONG_POLL_MAX_SECONDS = float(os.getenv("JOB_LONG_POLL_MAX_SECONDS", 30.0))
+
+    # Concurrency limits for third-party API calls made by each process
+    ASSEMBLYAI_CONCURRENCY = int(os.getenv("ASSEMBLYAI_CONCURRENCY", 4))  # Threads running blocking AssemblyAI calls
+    ASSEMBLYAI_POLL_INTERVAL = float(os.getenv("ASSEMBLYAI_POLL_INTERVAL", 3.0))  # Seconds between transcript status checks
+    OPENAI_CONCURRENCY = int(os.getenv("OPENAI_CONCURRENCY", 8))  # Concurrent OpenAI requests
+
+    # Chunked uploads
+    UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./temp_chunks")  # Directory to store chunks and assembled files
+    UPLOAD_BLOCK_SIZE = int(os.getenv("UPLOAD_BLOCK_SIZE", 1024 * 1024))  # Bytes copied per read when streaming
+    SESSION_STORE = os.getenv("SESSION_STORE", "memory")  # "memory" (single process) or "mongo" (shared)
+    SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", 24 * 3600))  # Idle sessions older than this expire
+    SESSION_SWEEP_INTERVAL = int(os.getenv("SESSION_SWEEP_INTERVAL", 600))  # Seconds between expiry sweeps
+
+    # Long recordings are split by duration and their segments transcribed in parallel
+    LONG_AUDIO_THRESHOLD_SECONDS = float(os.getenv("LONG_AUDIO_THRESHOLD_SECONDS", 40 * 60))
+    LONG_AUDIO_SEGMENT_SECONDS = float(os.getenv("LONG_AUDIO_SEGMENT_SECONDS", 20 * 60))
+    LONG_AUDIO_OVERLAP_SECONDS = float(os.getenv("LONG_AUDIO_OVERLAP_SECONDS", 15))  # Shared audio between segments
+    LONG_AUDIO_PARALLELISM = int(os.getenv("LONG_AUDIO_PARALLELISM", 4))  # Segments transcribed at once per file
+    AUDIO_SPLIT_CONCURRENCY = int(os.getenv("AUDIO_SPLIT_CONCURRENCY", 4))  # ffmpeg processes running at once
+    AUDIO_WORK_DIR = os.getenv("AUDIO_WORK_DIR")  # Parent of per-split temp directories (system temp if unset)
+
+    # Models and prices. Rates are USD per million tokens; MODEL_PRICING (JSON) adds or overrides
+    # entries, e.g. {"gpt-4.1": {"input": 2.0, "cached_input": 0.5, "output": 8.0}}
+    MODEL_PRICING = {
+        "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
+        "gpt-4o": {"input": 2.50, "cached_input": 1.25, "output": 10.00},
+        "gpt-4.1": {"input": 2.00, "cached_input": 0.50, "output": 8.00},
+        "gpt-4.1-mini": {"input": 0.40, "cached_input": 0.10, "output": 1.60},
+        "gpt-4.1-nano": {"input": 0.10, "cached_input": 0.025, "output": 0.40},
+        **json.loads(os.getenv("MODEL_PRICING", "{}")),
+    }
+    NOTE_MODEL = os.getenv("NOTE_MODEL", "gpt-4o-mini")  # Transcripts up to NOTE_MODEL_MAX_TOKENS, and questions
+    NOTE_MODEL_MAX_TOKENS = int(os.getenv("NOTE_MODEL_MAX_TOKENS", 30000))  # Prompt tokens, before any map-reduce
+    LONG_TRANSCRIPT_MODEL = os.getenv("LONG_TRANSCRIPT_MODEL", "gpt-4.1-mini")  # Long-context model for longer ones
+    TRANSCRIPTION_RATE_PER_HOUR = float(os.getenv("TRANSCRIPTION_RATE_PER_HOUR", 0.37))  # AssemblyAI, USD
+    BATCH_RATE_MULTIPLIER = float(os.getenv("BATCH_RATE_MULTIPLIER", 0.5))  # Batch API discount on token rates
+
+    # Note generation
+    # Larger transcripts use map-reduce; raise it to send more of a transcript to LONG_TRANSCRIPT_MODEL at once
+    MEETING_MINUTES_WINDOW_TOKENS = int(os.getenv("MEETING_MINUTES_WINDOW_TOKENS", 50000))
+    NOTE_TYPE_EXPECTED_OUTPUT_TOKENS = int(os.getenv("NOTE_TYPE_EXPECTED_OUTPUT_TOKENS", 400))  # For cost estimates
+    WINDOW_SUMMARY_EXPECTED_TOKENS = int(os.getenv("WINDOW_SUMMARY_EXPECTED_TOKENS", 800))  # Per map-step summary
+    # "combined" generates all note types in one JSON response; "per_type" sends one request per note type
+    NOTE_GENERATION_MODE = os.getenv("NOTE_GENERATION_MODE", "combined")
+    NOTE_TYPE_MAX_ATTEMPTS = int(os.getenv("NOTE_TYPE_MAX_ATTEMPTS", 3))  # Per note type request in per_type mode
+    NOTE_TYPE_RETRY_DELAY = float(os.getenv("NOTE_TYPE_RETRY_DELAY", 1.0))  # Seconds, doubled on each retry
+    # Stream the final completion so each note reaches clients and the job as soon as it is written
+    STREAM_NOTE_GENERATION = os.getenv("STREAM_NOTE_GENERATION", "true").lower() == "true"
+    MAX_NOTE_GENERATION_COST = float(os.getenv("MAX_NOTE_GENERATION_COST", 0)) or None  # USD per call; unset = no limit
+
+    # Deferred uploads generate notes through the batch API at a discount, within BATCH_COMPLETION_WINDOW
+    BATCH_BACKEND = os.getenv("BATCH_BACKEND", "openai")  # "openai" or "local" (answers at once; one process only, for testing)
+    BATCH_COMPLETION_WINDOW = os.getenv("BATCH_COMPLETION_WINDOW", "24h")
+    BATCH_SUBMIT_INTERVAL = int(os.getenv("BATCH_SUBMIT_INTERVAL", 300))  # Seconds between submitting pending requests
+    BATCH_POLL_INTERVAL = int(os.getenv("BATCH_POLL_INTERVAL", 60))  # Seconds between checks on submitted batches
+    BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", 1000))  # Requests per submitted batch
+
+    # Content-addressed cache of transcription and note generation results
+    RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+    RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+    # Call history pagination
+    CALLS_PAGE_SIZE = int(os.getenv("CALLS_PAGE_SIZE", 20))
+    CALLS_MAX_PAGE_SIZE = int(os.getenv("CALLS_MAX_PAGE_SIZE", 100))
+    CALLS_IMPORT_MAX_BATCH = int(os.getenv("CALLS_IMPORT_MAX_BATCH", 1000))  # Calls per bulk import request
+
+    # Signed access/refresh tokens and password hashing
+    AUTH_SECRET_KEY = os.getenv("AUTH_SECRET_KEY")
+    # Development only: without AUTH_SECRET_KEY, sign tokens with a random per-process key instead of refusing to start
+    AUTH_ALLOW_RANDOM_SECRET = os.getenv("AUTH_ALLOW_RANDOM_SECRET", "false").lower() == "true"
+    ACCESS_TOKEN_TTL_SECONDS = int(os.getenv("ACCESS_TOKEN_TTL_SECONDS", 15 * 60))
+    REFRESH_TOKEN_TTL_SECONDS = int(os.getenv("REFRESH_TOKEN_TTL_SECONDS", 30 * 24 * 60 * 60))
+    PASSWORD_HASH_CONCURRENCY = int(os.getenv("PASSWORD_HASH_CONCURRENCY", 2))  # bcrypt threads per process
+
+    # Search across stored calls
+    SEARCH_RESULT_LIMIT = int(os.getenv("SEARCH_RESULT_LIMIT", 20))
+    SEARCH_MAX_RESULT_LIMIT = int(os.getenv("SEARCH_MAX_RESULT_LIMIT", 100))
+    SEARCH_WINDOW_CHARS = int(os.getenv("SEARCH_WINDOW_CHARS", 1500))  # Transcript text per embedded window
+    # Embed calls as they are indexed, for semantic search (requires numpy)
+    SEARCH_EMBEDDINGS_ENABLED = os.getenv("SEARCH_EMBEDDINGS_ENABLED", "false").lower() == "true"
+    SEARCH_INDEX_CACHE_OWNERS = int(os.getenv("SEARCH_INDEX_CACHE_OWNERS", 256))  # Owners whose vectors stay in memory
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 256))  # Texts per embeddings request
+
+    # Questions about a single call, answered from its most relevant transcript windows
+    ASK_TOP_K = int(os.getenv("ASK_TOP_K", 4))  # Windows sent to the model per question
+    ASK_HISTORY_TURNS = int(os.getenv("ASK_HISTORY_TURNS", 3))  # Earlier questions and answers kept as context
+    ASK_CACHE_CALLS = int(os.getenv("ASK_CACHE_CALLS", 64))  # Calls whose window vectors stay in memory
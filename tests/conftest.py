@@ -0,0 +1,8 @@
+import os
+
+# utils refuses to import without a signing key; tests sign with a fixed one
+os.environ.setdefault("AUTH_SECRET_KEY", "test-secret")
+
+# the OpenAI and AssemblyAI clients are built at import time; tests never call them
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ.setdefault("ASSEMBLYAI_API_KEY", "test-key")
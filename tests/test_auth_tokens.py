@@ -0,0 +1,43 @@
+import pytest
+
+from utils.auth_tokens import ACCESS_TOKEN, REFRESH_TOKEN, InvalidToken, _encode, _sign, issue_token, verify_token
+
+
+def signed(payload: bytes):
+    encoded = _encode(payload)
+    return f"{encoded}.{_sign(encoded)}"
+
+
+def test_round_trip():
+    assert verify_token(issue_token("user-1", ACCESS_TOKEN, 60), ACCESS_TOKEN) == "user-1"
+
+
+def test_rejects_wrong_type_and_expired():
+    with pytest.raises(InvalidToken):
+        verify_token(issue_token("user-1", REFRESH_TOKEN, 60), ACCESS_TOKEN)
+    with pytest.raises(InvalidToken):
+        verify_token(issue_token("user-1", ACCESS_TOKEN, -1), ACCESS_TOKEN)
+
+
+@pytest.mark.parametrize("token", [
+    "",
+    "a.b.c",
+    "payload.signature",
+    "pāyload.sïgnature",
+    issue_token("user-1", ACCESS_TOKEN, 60) + "é",
+])
+def test_rejects_malformed_or_tampered(token):
+    with pytest.raises(InvalidToken):
+        verify_token(token, ACCESS_TOKEN)
+
+
+@pytest.mark.parametrize("payload", [b"not json", b"\xff\xfe", b"[1, 2]", b'{"typ": "access", "exp": 9999999999}'])
+def test_rejects_signed_garbage(payload):
+    with pytest.raises(InvalidToken):
+        verify_token(signed(payload), ACCESS_TOKEN)
+
+
+def test_rejects_signed_bad_base64():
+    payload = "a"  # a single base64 character can never decode
+    with pytest.raises(InvalidToken):
+        verify_token(f"{payload}.{_sign(payload)}", ACCESS_TOKEN)
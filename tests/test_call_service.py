@@ -0,0 +1,33 @@
+import base64
+import json
+from datetime import datetime, timezone
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from database import CallDetails
+from services.call_service import CallService
+
+
+def cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def test_cursor_round_trip():
+    call = CallDetails(id=ObjectId(), date=datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc))
+    assert CallService.decode_cursor(CallService.encode_cursor(call)) == (call.date, call.id)
+
+
+@pytest.mark.parametrize("value", [
+    "not base64!",
+    base64.urlsafe_b64encode(b"not json").decode(),
+    cursor({"date": "2026-01-02T03:04:05+00:00"}),
+    cursor({"date": "yesterday", "id": str(ObjectId())}),
+    cursor({"date": "2026-01-02T03:04:05+00:00", "id": "not-an-object-id"}),
+    cursor({"date": "2026-01-02T03:04:05+00:00", "id": 42}),
+])
+def test_invalid_cursor_is_a_bad_request(value):
+    with pytest.raises(HTTPException) as error:
+        CallService.decode_cursor(value)
+    assert error.value.status_code == 400
@@ -0,0 +1,26 @@
+from utils.chunk_bitmap import ChunkBitmap
+
+
+def test_tracks_received_and_missing_chunks():
+    bitmap = ChunkBitmap(40)
+    for index in (0, 31, 32, 39):
+        bitmap.add(index)
+    assert len(bitmap) == 4
+    assert 32 in bitmap and 1 not in bitmap
+    assert bitmap.missing()[:3] == [1, 2, 3]
+    assert not bitmap.is_complete()
+
+
+def test_complete_once_every_chunk_arrived():
+    bitmap = ChunkBitmap(3)
+    for index in range(3):
+        bitmap.add(index)
+    assert bitmap.is_complete()
+
+
+def test_bits_beyond_total_chunks_are_ignored():
+    # Stored words may carry bits past total_chunks, e.g. from a request with a larger total
+    bitmap = ChunkBitmap(3, [0b1011, 0b1])
+    assert len(bitmap) == 2
+    assert bitmap.missing() == [2]
+    assert not bitmap.is_complete()
@@ -0,0 +1,79 @@
+from services.long_audio_service import LongAudioService
+
+
+def utterance(speaker, start, end, text="", words=None):
+    result = {"speaker": speaker, "start": start, "end": end, "text": text, "confidence": 0.9}
+    if words is not None:
+        result["words"] = words
+    return result
+
+
+def spoken(start, end, step=1000):
+    # One word per step milliseconds, named after its start time
+    return [{"text": f"w{time}", "start": time, "end": time + step - 100, "confidence": 0.9}
+            for time in range(start, end, step)]
+
+
+def test_plan_segments_overlaps_consecutive_segments():
+    assert LongAudioService.plan_segments(2500, 1200, 15) == [(0.0, 1215), (1200.0, 1215), (2400.0, 100.0)]
+
+
+def test_plan_segments_short_recording_is_one_segment():
+    assert LongAudioService.plan_segments(600, 1200, 15) == [(0.0, 600)]
+
+
+def test_plan_segments_skips_tail_covered_by_overlap():
+    assert LongAudioService.plan_segments(1210, 1200, 15) == [(0.0, 1210)]
+
+
+def test_rebase_shifts_words():
+    rebased = LongAudioService.rebase([utterance("A", 0, 2000, "w0 w1", spoken(0, 2000))], 5000)
+    assert rebased[0]["start"] == 5000
+    assert [word["start"] for word in rebased[0]["words"]] == [5000, 6000]
+
+
+def test_merge_segments_single_speaker_keeps_whole_recording():
+    # One speaker talking through both segments: each segment is a single turn spanning the overlap
+    first = utterance("A", 0, 12000, words=spoken(0, 12000))
+    second = utterance("A", 10000, 20000, words=spoken(10000, 20000))
+    merged = LongAudioService.merge_segments([(0, 12000, [first]), (10000, 10000, [second])])
+
+    assert [item["speaker"] for item in merged] == ["A", "A"]
+    text = " ".join(item["text"] for item in merged).split()
+    assert text == [f"w{time}" for time in range(0, 20000, 1000)]
+    assert merged[0]["end"] < merged[1]["start"]
+    assert all("words" not in item for item in merged)
+
+
+def test_merge_segments_without_words_splits_by_time():
+    first = utterance("A", 0, 12000, " ".join(f"w{index}" for index in range(12)))
+    second = utterance("A", 10000, 20000, " ".join(f"w{index}" for index in range(10, 20)))
+    merged = LongAudioService.merge_segments([(0, 12000, [first]), (10000, 10000, [second])])
+
+    assert [(item["start"], item["end"]) for item in merged] == [(0, 11000), (11000, 20000)]
+    assert " ".join(item["text"] for item in merged).split() == [f"w{index}" for index in range(20)]
+
+
+def test_merge_segments_keeps_overlap_utterances_once():
+    shared = utterance("B", 10500, 11500, "shared")
+    first = [utterance("B", 0, 5000, "one"), dict(shared)]
+    second = [dict(shared, speaker="A"), utterance("A", 14000, 18000, "two")]
+    merged = LongAudioService.merge_segments([(0, 12000, first), (10000, 10000, second)])
+
+    assert [item["text"] for item in merged] == ["one", "shared", "two"]
+    # The second segment labels the same voice "A"; it is mapped back onto the first segment's label
+    assert len({item["speaker"] for item in merged}) == 1
+
+
+def test_reconcile_speakers_matches_by_overlap_time():
+    previous = [utterance("A", 0, 10500), utterance("B", 10500, 12000)]
+    current = [utterance("B", 10000, 10500), utterance("A", 10500, 12000), utterance("C", 12000, 15000)]
+    speaker_map = LongAudioService.reconcile_speakers(previous, current, {"A": "A", "B": "B"}, {"A", "B"})
+    assert speaker_map == {"B": "A", "A": "B", "C": "C"}
+
+
+def test_reconcile_speakers_gives_new_speakers_unused_labels():
+    previous = [utterance("A", 0, 12000)]
+    current = [utterance("A", 10000, 12000), utterance("B", 12000, 15000)]
+    speaker_map = LongAudioService.reconcile_speakers(previous, current, {"A": "C"}, {"A", "B", "C"})
+    assert speaker_map == {"A": "C", "B": "D"}
@@ -1 +1,4 @@
 from utils.utils import NOTE_TYPE_DESCRIPTORS, pwd_context
+from utils.chunk_bitmap import ChunkBitmap
+from utils.auth_tokens import issue_token, verify_token, InvalidToken, ACCESS_TOKEN, REFRESH_TOKEN
+from utils.incremental_json import IncrementalJsonParser
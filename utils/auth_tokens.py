@@ -0,0 +1,72 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import secrets
+import time
+
+from settings import Config
+
+
+ACCESS_TOKEN = "access"
+REFRESH_TOKEN = "refresh"
+
+if Config.AUTH_SECRET_KEY:
+    _secret = Config.AUTH_SECRET_KEY.encode()
+elif Config.AUTH_ALLOW_RANDOM_SECRET:
+    # Tokens signed with a random key stop working on restart and are not shared between replicas
+    print("AUTH_SECRET_KEY is not set; using a random key for this process (AUTH_ALLOW_RANDOM_SECRET)")
+    _secret = secrets.token_bytes(32)
+else:
+    raise RuntimeError("AUTH_SECRET_KEY is not set; set it, or set AUTH_ALLOW_RANDOM_SECRET=true for development")
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def issue_token(user_id: str, token_type: str, ttl_seconds: int):
+    """
+    Signed token "<payload>.<signature>", both base64url: the payload is JSON with the user id,
+    token type and expiry, and the signature is HMAC-SHA256 over the encoded payload.
+    """
+    now = int(time.time())
+    payload = _encode(json.dumps({"sub": user_id, "typ": token_type, "iat": now, "exp": now + ttl_seconds},
+                                 separators=(",", ":")).encode())
+    return f"{payload}.{_sign(payload)}"
+
+
+def verify_token(token: str, token_type: str):
+    # Returns the user id; checks the signature, type and expiry without any database access
+    try:
+        payload, signature = token.split(".")
+    except ValueError:
+        raise InvalidToken("Malformed token")
+    # compare_digest only accepts ASCII str, so compare bytes to reject non-ASCII tokens cleanly
+    if not hmac.compare_digest(signature.encode(), _sign(payload).encode()):
+        raise InvalidToken("Invalid token signature")
+
+    try:
+        claims = json.loads(_decode(payload))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise InvalidToken("Malformed token")
+    if not isinstance(claims, dict) or not isinstance(claims.get("sub"), str):
+        raise InvalidToken("Malformed token")
+    if claims.get("typ") != token_type:
+        raise InvalidToken("Wrong token type")
+    if claims.get("exp", 0) < time.time():
+        raise InvalidToken("Token expired")
+    return claims["sub"]
+
+
+def _sign(payload: str):
+    return _encode(hmac.new(_secret, payload.encode(), hashlib.sha256).digest())
+
+
+def _encode(data: bytes):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _decode(data: str):
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
@@ -0,0 +1,43 @@
+WORD_BITS = 32  # Bits per stored word; small enough for MongoDB's $bit on 64-bit integers
+
+
+class ChunkBitmap:
+    """
+    Compact record of which chunk indices of an upload have arrived, one bit per chunk.
+    Stored as a list of integer words so MongoDB can set bits atomically with $bit.
+    """
+
+    def __init__(self, total_chunks: int, words: list = None):
+        self.total_chunks = total_chunks
+        self.words = list(words) if words else [0] * self.word_count(total_chunks)
+
+    @staticmethod
+    def word_count(total_chunks: int):
+        return (total_chunks + WORD_BITS - 1) // WORD_BITS
+
+    @staticmethod
+    def position(index: int):
+        # Word index and bit mask for a chunk index
+        return index // WORD_BITS, 1 << (index % WORD_BITS)
+
+    def add(self, index: int):
+        word, mask = self.position(index)
+        self.words[word] |= mask
+
+    def __contains__(self, index: int):
+        word, mask = self.position(index)
+        return word < len(self.words) and bool(self.words[word] & mask)
+
+    def __len__(self):
+        # Only bits below total_chunks count, whatever else a stored word array may hold
+        count = 0
+        for index, word in enumerate(self.words[:self.word_count(self.total_chunks)]):
+            valid_bits = min(WORD_BITS, self.total_chunks - index * WORD_BITS)
+            count += (word & ((1 << valid_bits) - 1)).bit_count()
+        return count
+
+    def missing(self):
+        return [index for index in range(self.total_chunks) if index not in self]
+
+    def is_complete(self):
+        return len(self) == self.total_chunks
@@ -0,0 +1,88 @@
+import json
+
+
+class IncrementalJsonParser:
+    """
+    Parses a JSON document as it arrives in pieces, e.g. from a streamed completion, and
+    reports each scalar value as soon as it is complete together with its path of object
+    keys and array indices. Text before the first '{' or '[' (such as a ```json fence) and
+    after the document ends is ignored.
+    """
+
+    def __init__(self):
+        self.stack = []  # One entry per open container: [kind, current key or index, expecting a key]
+        self.started = False
+        self.finished = False
+        self.in_string = False
+        self.escaped = False
+        self.buffer = []  # Raw characters of the string or bare literal being read
+        self.in_literal = False
+
+    def feed(self, text: str):
+        completed = []
+        for char in text:
+            if self.finished:
+                break
+            if self.in_string:
+                self._read_string(char, completed)
+            elif self.in_literal and char not in ",}] \t\r\n":
+                self.buffer.append(char)
+            else:
+                if self.in_literal:
+                    self._end_literal(completed)
+                self._read_structure(char)
+        return completed
+
+    def _read_string(self, char: str, completed: list):
+        if self.escaped:
+            self.escaped = False
+        elif char == "\\":
+            self.escaped = True
+        elif char == '"':
+            self.in_string = False
+            value = json.loads('"' + "".join(self.buffer) + '"')
+            self.buffer = []
+            container = self.stack[-1]
+            if container[0] == "object" and container[2]:
+                container[1] = value
+                container[2] = False
+            else:
+                completed.append((self._path(), value))
+            return
+        self.buffer.append(char)
+
+    def _end_literal(self, completed: list):
+        self.in_literal = False
+        completed.append((self._path(), json.loads("".join(self.buffer))))
+        self.buffer = []
+
+    def _read_structure(self, char: str):
+        if not self.started:
+            if char in "{[":
+                self.started = True
+                self._open(char)
+            return
+
+        if char in "{[":
+            self._open(char)
+        elif char in "}]":
+            self.stack.pop()
+            if not self.stack:
+                self.finished = True
+        elif char == '"':
+            self.in_string = True
+        elif char == ",":
+            container = self.stack[-1]
+            if container[0] == "object":
+                container[2] = True
+            else:
+                container[1] += 1
+        elif char not in ": \t\r\n":
+            self.in_literal = True
+            self.buffer.append(char)
+
+    def _open(self, char: str):
+        self.stack.append(["object", None, True] if char == "{" else ["array", 0, False])
+
+    def _path(self):
+        return tuple(container[1] for container in self.stack)
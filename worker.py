@@ -0,0 +1,29 @@
+import asyncio
+
+from database import Database, AsyncDatabase
+from services.batch_service import BatchService, require_single_process_backend
+from services.job_service import JobService
+from services.transcription_service import TranscriptionService
+from settings import Config
+
+
+async def run_workers():
+    job_service = JobService(TranscriptionService())
+    batch_service = BatchService(job_service)
+    job_service.start(Config.JOB_WORKERS)
+    batch_service.start()
+    try:
+        # Workers run until the process is stopped
+        await asyncio.Event().wait()
+    finally:
+        await batch_service.stop()
+        await job_service.stop()
+        await AsyncDatabase.close()
+
+
+# Standalone entry point so transcription workers can be scaled separately from API replicas
+if __name__ == "__main__":
+    require_single_process_backend()
+    Database()
+    Database.ensure_indexes()
+    asyncio.run(run_workers())